@@ -0,0 +1,259 @@
+"""Benchmark :func:`jinjaapidoc.gendoc.generate` on synthetic package trees.
+
+Each tree consists of nested packages with a number of modules each.
+Every module declares public and private classes, exceptions, functions and
+data and re-exports a class of a sibling module via ``__all__``.
+
+Run e.g.::
+
+  python benchmarks/bench_generate.py --preset 10 --preset 1000 --output bench.json
+
+The total time of :func:`jinjaapidoc.gendoc.generate` is measured, as well as
+the time of its phases when run separately: directory walk, context creation
+(import and introspection), template rendering and writing the files.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import sphinx
+
+import jinjaapidoc
+from jinjaapidoc import gendoc
+from jinjaapidoc import updatedoc
+
+PRESETS = {
+    '10': dict(breadth=1, depth=1, modules=4, members=10),
+    '1000': dict(breadth=10, depth=2, modules=9, members=10),
+    '10000': dict(breadth=10, depth=3, modules=9, members=10),
+}
+"""Tree shapes with roughly 10, 1,000 and 10,000 generated pages."""
+
+MODULE_TEMPLATE = '''"""Synthetic module {name}."""
+'''
+REEXPORT_TEMPLATE = '''
+# at the end, so the circular imports between siblings resolve
+from .{sibling} import PublicClass0 as Reexported  # noqa: E402
+
+__all__ = ['Reexported']
+'''
+
+
+def make_module_source(name, sibling, members):
+    """Return the source of a synthetic module
+
+    :param name: the module name
+    :type name: :class:`str`
+    :param sibling: the module to re-export a class from
+    :type sibling: :class:`str` | None
+    :param members: the number of members of each kind
+    :type members: :class:`int`
+    :returns: the source
+    :rtype: :class:`str`
+    """
+    lines = [MODULE_TEMPLATE.format(name=name)]
+    for i in range(members):
+        lines.append('class PublicClass%s(object):\n    """Class %s."""\n\n    def method(self):\n        pass\n\n' % (i, i))
+        lines.append('class _PrivateClass%s(object):\n    pass\n\n' % i)
+        lines.append('class Error%s(ValueError):\n    pass\n\n' % i)
+        lines.append('def function%s(a, b=1):\n    """Function %s."""\n    return a + b\n\n' % (i, i))
+        lines.append('def _private%s():\n    pass\n\n' % i)
+        lines.append('DATA%s = %s\n_PRIVATE_DATA%s = %s\n\n' % (i, i, i, i))
+    if sibling:
+        lines.append(REEXPORT_TEMPLATE.format(sibling=sibling))
+    return ''.join(lines)
+
+
+def make_tree(root, name, breadth, depth, modules, members):
+    """Create a synthetic package tree
+
+    :param root: the directory to create the root package in
+    :type root: :class:`str`
+    :param name: the name of the root package
+    :type name: :class:`str`
+    :param breadth: subpackages per package
+    :type breadth: :class:`int`
+    :param depth: levels of subpackages below the root package
+    :type depth: :class:`int`
+    :param modules: modules per package
+    :type modules: :class:`int`
+    :param members: members of each kind per module
+    :type members: :class:`int`
+    :returns: the path of the root package and the number of packages and modules
+    :rtype: :class:`tuple`
+    """
+    count = [0]
+
+    def make_package(path, level):
+        os.mkdir(path)
+        count[0] += 1
+        with open(os.path.join(path, gendoc.INITPY), 'w') as f:
+            f.write('"""Synthetic package."""\n')
+        for i in range(modules):
+            with open(os.path.join(path, 'mod%s.py' % i), 'w') as f:
+                sibling = 'mod%s' % ((i + 1) % modules) if modules > 1 else None
+                f.write(make_module_source('mod%s' % i, sibling, members))
+            count[0] += 1
+        if level < depth:
+            for i in range(breadth):
+                make_package(os.path.join(path, 'sub%s' % i), level + 1)
+
+    path = os.path.join(root, name)
+    make_package(path, 0)
+    return path, count[0]
+
+
+def evict(name):
+    """Remove the package and its submodules from :data:`sys.modules`
+
+    :param name: the root package name
+    :type name: :class:`str`
+    :returns: None
+    :rtype: None
+    """
+    for modname in list(sys.modules):
+        if modname == name or modname.startswith(name + '.'):
+            del sys.modules[modname]
+
+
+def timed(func, *args, **kwargs):
+    """Call the function and return the elapsed time and the result
+
+    :returns: the elapsed seconds and the result
+    :rtype: :class:`tuple`
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_phases(app, src, dest, template_dirs):
+    """Run the phases of the generation separately and time them
+
+    :returns: the seconds per phase
+    :rtype: :class:`dict`
+    """
+    env = gendoc.make_environment(gendoc.make_loader(template_dirs))
+    index = gendoc.PackageIndex()
+    walk, items = timed(lambda: list(gendoc.iter_tree(app, src, [], True, True, index)))
+
+    def contexts():
+        result = []
+        for root_package, name, path, ispkg in items:
+            fullname = gendoc.makename(root_package, name)
+            entry = index.get(path)
+            var = gendoc.get_context(app, root_package, name, fullname, path, entry)
+            result.append((fullname, var, ispkg))
+            if ispkg:
+                for submod in var['submods']:
+                    modpath = entry.modpaths.get(submod)
+                    subname = gendoc.makename(fullname, submod)
+                    result.append((subname, gendoc.get_context(app, fullname, submod, subname, modpath), False))
+        return result
+
+    context, variables = timed(contexts)
+    render, texts = timed(lambda: [(fullname, gendoc.render_context(env, var, ispkg))
+                                   for fullname, var, ispkg in variables])
+    write, _ = timed(lambda: [gendoc.write_file(app, fullname, text, dest, 'rst', False, True)
+                              for fullname, text in texts])
+    return {'walk': walk, 'context': context, 'render': render, 'write': write}
+
+
+def run(name, breadth, depth, modules, members, repeat=3, static=False, workers=1, writers=0):
+    """Benchmark one tree shape
+
+    :returns: the result
+    :rtype: :class:`dict`
+    """
+    tmp = tempfile.mkdtemp(prefix='jinjaapidoc-bench-')
+    pkgname = 'benchpkg%s' % name
+    try:
+        src, count = make_tree(tmp, pkgname, breadth, depth, modules, members)
+        sys.path.insert(0, tmp)
+        template_dirs = [os.path.join(os.path.dirname(gendoc.__file__), gendoc.TEMPLATE_DIR)]
+        config = updatedoc.make_config(static_analysis=static, workers=workers)
+        totals = []
+        phases = []
+        for i in range(repeat):
+            dest = os.path.join(tmp, 'out%s' % i)
+            app = updatedoc.App(config, dest, dest)
+            evict(pkgname)
+            totals.append(timed(gendoc.generate, app, src, dest, template_dirs=template_dirs, workers=workers,
+                                writers=writers)[0])
+            evict(pkgname)
+            phasedest = os.path.join(tmp, 'phases%s' % i)
+            os.mkdir(phasedest)
+            phases.append(run_phases(app, src, phasedest, template_dirs))
+        evict(pkgname)
+        sys.path.remove(tmp)
+    finally:
+        shutil.rmtree(tmp)
+    return {'name': name,
+            'breadth': breadth,
+            'depth': depth,
+            'modules': modules,
+            'members': members,
+            'static': static,
+            'workers': workers,
+            'writers': writers,
+            'pages': count,
+            'total': min(totals),
+            'phases': dict((k, min(p[k] for p in phases)) for k in phases[0])}
+
+
+def main(argv=None):
+    """Run the benchmarks and write the results
+
+    :param argv: the arguments without the program name
+    :type argv: :class:`list` | None
+    :returns: the exit code
+    :rtype: :class:`int`
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--preset', action='append', choices=sorted(PRESETS, key=int),
+                        help='tree shape with roughly this many pages. Can be given multiple times.')
+    parser.add_argument('--breadth', type=int, help='subpackages per package for a custom tree')
+    parser.add_argument('--depth', type=int, default=1, help='levels of subpackages for a custom tree')
+    parser.add_argument('--modules', type=int, default=9, help='modules per package for a custom tree')
+    parser.add_argument('--members', type=int, default=10, help='members of each kind per module')
+    parser.add_argument('--repeat', type=int, default=3, help='take the fastest of this many runs')
+    parser.add_argument('--static', action='store_true', help='use static analysis')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--writers', type=int, default=0, help='number of writer threads')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args(argv)
+
+    shapes = [(p, PRESETS[p]) for p in args.preset or []]
+    if args.breadth is not None:
+        shapes.append(('custom', dict(breadth=args.breadth, depth=args.depth,
+                                      modules=args.modules, members=args.members)))
+    if not shapes:
+        shapes = [('10', PRESETS['10'])]
+
+    results = []
+    for name, shape in shapes:
+        result = run(name, repeat=args.repeat, static=args.static, workers=args.workers,
+                     writers=args.writers, **shape)
+        results.append(result)
+        print('%(name)8s %(pages)6d pages  total %(total)8.3fs  ' % result +  # noqa: W504
+              '  '.join('%s %.3fs' % (k, v) for k, v in sorted(result['phases'].items())))
+
+    if args.output:
+        data = {'jinjaapidoc': jinjaapidoc.__version__,
+                'python': platform.python_version(),
+                'sphinx': sphinx.__version__,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Benchmark the time to load the jinjaapidoc extension.
+
+Each measurement runs in a fresh interpreter, so no module is cached::
+
+  python benchmarks/bench_startup.py --repeat 10
+
+``import`` is the time of ``import jinjaapidoc``, e.g. for reading the
+config values. ``setup`` additionally loads the extension into a sphinx
+app stand-in, which imports autodoc and autosummary, but not the
+generation machinery unless ``jinjaapi_srcdir`` is set.
+"""
+import argparse
+import subprocess
+import sys
+
+IMPORT_CODE = '''
+import time
+start = time.perf_counter()
+import jinjaapidoc
+print(time.perf_counter() - start)
+'''
+
+SETUP_CODE = '''
+import time
+start = time.perf_counter()
+import jinjaapidoc
+
+
+class App(object):
+    def connect(self, event, callback):
+        pass
+
+    def setup_extension(self, name):
+        __import__(name)
+
+    def add_autodocumenter(self, cls):
+        pass
+
+    def add_config_value(self, name, default, rebuild):
+        pass
+
+
+jinjaapidoc.setup(App())
+print(time.perf_counter() - start)
+'''
+
+
+def measure(code, repeat):
+    """Run the code in fresh interpreters and return the fastest time it prints
+
+    :returns: the seconds
+    :rtype: :class:`float`
+    """
+    return min(float(subprocess.check_output([sys.executable, '-c', code])) for i in range(repeat))
+
+
+def main(argv=None):
+    """Run the benchmarks and print the results
+
+    :param argv: the arguments without the program name
+    :type argv: :class:`list` | None
+    :returns: the exit code
+    :rtype: :class:`int`
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='take the fastest of this many runs')
+    args = parser.parse_args(argv)
+    print('import %8.3fs' % measure(IMPORT_CODE, args.repeat))
+    print('setup  %8.3fs' % measure(SETUP_CODE, args.repeat))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -37,6 +37,7 @@ class PyTest(TestCommand):
 long_description = read('README.rst', 'HISTORY.rst')
 install_requires = ['jinja2', 'sphinx>=1.8.5']
 tests_require = ['pytest']
+extras_require = {'watch': ['watchdog']}
 
 
 setup(
@@ -54,6 +55,7 @@ setup(
     include_package_data=True,
     tests_require=tests_require,
     install_requires=install_requires,
+    extras_require=extras_require,
     cmdclass={'test': PyTest},
     entry_points={
         'console_scripts': [
@@ -1,10 +1,126 @@
-import jinjaapidoc.ext as ext
-import jinjaapidoc.gendoc as gendoc
+import importlib
+import sys
+import types
 
 __author__ = 'David Zuber'
 __email__ = 'zuber.david@gmx.de'
 __version__ = '0.5.0'
 
+CONFIG_VALUES = [
+    ('jinjaapi_outputdir', '', 'env'),
+    ('jinjaapi_nodelete', True, 'env'),
+    ('jinjaapi_srcdir', '', 'env'),
+    ('jinjaapi_exclude_paths', [], 'env'),
+    ('jinjaapi_force', True, 'env'),
+    ('jinjaapi_followlinks', True, 'env'),
+    ('jinjaapi_dryrun', False, 'env'),
+    ('jinjaapi_includeprivate', True, 'env'),
+    ('jinjaapi_addsummarytemplate', True, 'env'),
+    ('jinjaapi_include_from_all', True, 'env'),
+    ('jinjaapi_cache', False, ''),
+    ('jinjaapi_static_analysis', False, 'env'),
+    ('jinjaapi_workers', 0, ''),
+    ('jinjaapi_sync', False, 'env'),
+    ('jinjaapi_timing', False, ''),
+    ('jinjaapi_timing_file', '', ''),
+    ('jinjaapi_timing_top', 10, ''),
+    ('jinjaapi_template_cache', True, ''),
+    ('jinjaapi_precompile_templates', False, ''),
+    ('jinjaapi_isolate', False, ''),
+    ('jinjaapi_import_timeout', 60, ''),
+    ('jinjaapi_import_memory_limit', 0, ''),
+    ('jinjaapi_evict_modules', False, ''),
+    ('jinjaapi_writer_threads', 0, ''),
+    ('jinjaapi_generate_classes', False, 'env'),
+    ('jinjaapi_page_size', 0, 'env'),
+    ('jinjaapi_page_grouping', 'chunk', 'env'),
+    ('jinjaapi_stubs', False, 'env'),
+    ('jinjaapi_inventory', '', ''),
+    ('jinjaapi_plan', False, ''),
+    ('jinjaapi_profile_imports', False, ''),
+    ('jinjaapi_profile_dir', '', ''),
+]
+"""The config values of jinjaapidoc with their defaults and rebuild condition.
+
+Values that change the generated documents reread all documents. The
+performance and reporting options do not, because the generated documents
+that changed are reported to sphinx, see :func:`env_get_outdated`.
+"""
+
+LAZY_MODULES = ('ext', 'gendoc')
+"""Submodules that are only imported on first access.
+
+Importing them pulls in jinja2 and most of sphinx, which is not needed
+to load the extension or to read the config values.
+"""
+
+
+class LazyModule(types.ModuleType):
+    """Type of the :mod:`jinjaapidoc` module that imports :data:`LAZY_MODULES` on first attribute access.
+
+    A module level ``__getattr__`` (:pep:`562`) requires python 3.7.
+    """
+
+    def __getattr__(self, name):
+        """Import :data:`LAZY_MODULES` on first attribute access
+
+        :param name: the attribute name
+        :type name: :class:`str`
+        :returns: the submodule
+        :rtype: :class:`types.ModuleType`
+        :raises: :class:`AttributeError` for any other name
+        """
+        if name in LAZY_MODULES:
+            return importlib.import_module('%s.%s' % (self.__name__, name))
+        raise AttributeError('module %r has no attribute %r' % (self.__name__, name))
+
+
+sys.modules[__name__].__class__ = LazyModule
+
+
+def builder_inited(app):
+    """Generate the rst files if ``jinjaapi_srcdir`` is set
+
+    The generation machinery is only imported if there is something to generate.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    if not app.config.jinjaapi_srcdir:
+        return
+    from jinjaapidoc import gendoc
+    app.jinjaapidoc_report = gendoc.main(app)
+
+
+def env_get_outdated(app, env, added, changed, removed):
+    """Return the generated documents that changed but sphinx did not detect
+
+    See :func:`jinjaapidoc.gendoc.get_outdated`. In plan mode nothing was
+    written, so there is nothing to read.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the sphinx environment. Sphinx 1.8 passes the builder.
+    :type env: :class:`sphinx.environment.BuildEnvironment`
+    :param added: the documents sphinx found to be new
+    :type added: :class:`set`
+    :param changed: the documents sphinx found to be changed
+    :type changed: :class:`set`
+    :param removed: the documents sphinx found to be removed
+    :type removed: :class:`set`
+    :returns: the additional document names to read
+    :rtype: :class:`list`
+    :raises: None
+    """
+    report = getattr(app, 'jinjaapidoc_report', None)
+    if report is None or app.config.jinjaapi_plan:
+        return []
+    from jinjaapidoc import gendoc
+    return gendoc.get_outdated(app, added, changed, report)
+
 
 def setup(app):
     """Setup the sphinx extension
@@ -12,7 +128,8 @@ def setup(app):
     This will setup autodoc and autosummary.
     Add the :class:`ext.ModDocstringDocumenter`.
     Add the config values.
-    Connect builder-inited event to :func:`gendoc.main`.
+    Connect builder-inited event to :func:`builder_inited`.
+    Connect env-get-outdated event to :func:`env_get_outdated`.
 
     :param app: the sphinx app
     :type app: :class:`sphinx.application.Sphinx`
@@ -20,23 +137,18 @@ def setup(app):
     :rtype: None
     :raises: None
     """
+    from jinjaapidoc import ext
+
     # Connect before autosummary
-    app.connect('builder-inited', gendoc.main)
+    app.connect('builder-inited', builder_inited)
+    app.connect('env-get-outdated', env_get_outdated)
 
     app.setup_extension('sphinx.ext.autodoc')
     app.setup_extension('sphinx.ext.autosummary')
 
     app.add_autodocumenter(ext.ModDocstringDocumenter)
 
-    app.add_config_value('jinjaapi_outputdir', '', 'env')
-    app.add_config_value('jinjaapi_nodelete', True, 'env')
-    app.add_config_value('jinjaapi_srcdir', '', 'env')
-    app.add_config_value('jinjaapi_exclude_paths', [], 'env')
-    app.add_config_value('jinjaapi_force', True, 'env')
-    app.add_config_value('jinjaapi_followlinks', True, 'env')
-    app.add_config_value('jinjaapi_dryrun', False, 'env')
-    app.add_config_value('jinjaapi_includeprivate', True, 'env')
-    app.add_config_value('jinjaapi_addsummarytemplate', True, 'env')
-    app.add_config_value('jinjaapi_include_from_all', True, 'env')
+    for name, default, rebuild in CONFIG_VALUES:
+        app.add_config_value(name, default, rebuild)
 
     return {'version': __version__, 'parallel_read_safe': True}
@@ -0,0 +1,197 @@
+"""This module contains a persistent cache for the template contexts.
+
+The context of a module only changes if its source or the sources of the
+modules it re-exports members from change, so it is stored on disk together
+with stamps of these files. As long as the stamps match, the module does not
+have to be imported again.
+"""
+import hashlib
+import json
+import os
+
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILENAME = 'jinjaapidoc-context.json'
+"""Name of the cache file inside the sphinx doctree directory."""
+CACHE_VERSION = 2
+"""Version of the cache format. Bump this to invalidate all existing caches."""
+CONTEXT_VALUES = ('jinjaapi_exclude_paths', 'jinjaapi_includeprivate', 'jinjaapi_include_from_all',
+                  'jinjaapi_static_analysis', 'jinjaapi_stubs', 'jinjaapi_generate_classes',
+                  'jinjaapi_page_size', 'jinjaapi_page_grouping')
+"""Config values that change the contexts. Only they are part of the key."""
+
+
+def make_key(config, names=CONTEXT_VALUES):
+    """Return a key for the given config values of the given config
+
+    If any of the config values change, the key changes as well.
+
+    :param config: the sphinx config
+    :type config: :class:`sphinx.config.Config`
+    :param names: the names of the config values
+    :type names: iterable
+    :returns: the key
+    :rtype: :class:`str`
+    :raises: None
+    """
+    values = sorted((name, repr(getattr(config, name))) for name in names)
+    return hashlib.sha1(repr((CACHE_VERSION, values)).encode('utf-8')).hexdigest()
+
+
+def make_stamp(path):
+    """Return a stamp for the given module or package path
+
+    For packages the stamp also covers the directory itself, so adding or
+    removing a submodule invalidates the package. A ``.pyi`` stub next to the
+    module is covered as well.
+
+    :param path: the path to the module file or package directory
+    :type path: :class:`str`
+    :returns: the stamp or None if the path does not exist
+    :rtype: :class:`list` | None
+    :raises: None
+    """
+    paths = [path]
+    if os.path.isdir(path):
+        paths.append(os.path.join(path, '__init__.py'))
+    stub = os.path.splitext(paths[-1])[0] + '.pyi'
+    if stub != path and os.path.isfile(stub):
+        paths.append(stub)
+    stamp = []
+    try:
+        for p in paths:
+            st = os.stat(p)
+            stamp.extend([st.st_mtime_ns, st.st_size])
+    except OSError:
+        return None
+    return stamp
+
+
+class ContextCache(object):
+    """A persistent mapping of source paths to template contexts.
+
+    The fingerprint of the templates the pages were last rendered with is
+    stored in :attr:`templates`, see :func:`jinjaapidoc.gendoc.plan`.
+    """
+
+    def __init__(self, filename, key):
+        """Initialize a new cache
+
+        Call :meth:`load` to read the existing entries.
+
+        :param filename: the file to store the cache in
+        :type filename: :class:`str`
+        :param key: the key from :func:`make_key`. If it differs from the stored one, all entries are discarded.
+        :type key: :class:`str`
+        :raises: None
+        """
+        self.filename = filename
+        self.key = key
+        self.entries = {}
+        self.templates = None
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Load the entries from disk
+
+        A missing, corrupt or outdated cache file results in an empty cache.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.entries = {}
+        self.templates = None
+        try:
+            with open(self.filename, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            logger.debug('No usable context cache at %s', self.filename)
+            return
+        if data.get('key') != self.key:
+            logger.info('jinjaapidoc config changed, discarding context cache.')
+            return
+        self.entries = data.get('entries', {})
+        self.templates = data.get('templates')
+
+    def save(self):
+        """Write the entries to disk
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'key': self.key, 'templates': self.templates, 'entries': self.entries}, f)
+        os.replace(tmp, self.filename)
+
+    def get(self, path):
+        """Return the cached context for the given path or None if it is outdated
+
+        :param path: the path to the module file or package directory
+        :type path: :class:`str`
+        :returns: the context or None
+        :rtype: :class:`dict` | None
+        :raises: None
+        """
+        self.seen.add(path)
+        if self.is_current(path):
+            self.hits += 1
+            return dict(self.entries[path]['context'])
+        self.misses += 1
+        return None
+
+    def is_current(self, path):
+        """Return True if there is an entry for the path and neither the source nor its dependencies changed since
+
+        The dependencies are the files listed in the ``depends`` variable of
+        the context, see :func:`jinjaapidoc.gendoc.get_depends`.
+        Unlike :meth:`get`, the context is not copied and the path is not marked as seen.
+
+        :param path: the path to the module file or package directory
+        :type path: :class:`str`
+        :returns: True if the entry is up to date
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        entry = self.entries.get(path)
+        if entry is None or entry['stamp'] != make_stamp(path):
+            return False
+        return all(make_stamp(p) == stamp for p, stamp in entry['depends'].items())
+
+    def set(self, path, context):
+        """Store the context for the given path
+
+        The source and the files in the ``depends`` variable of the context are stamped.
+
+        :param path: the path to the module file or package directory
+        :type path: :class:`str`
+        :param context: the template context
+        :type context: :class:`dict`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.seen.add(path)
+        stamp = make_stamp(path)
+        depends = dict((p, make_stamp(p)) for p in context.get('depends', []))
+        if stamp is not None and None not in depends.values():
+            self.entries[path] = {'stamp': stamp, 'depends': depends, 'context': dict(context)}
+
+    def prune(self):
+        """Drop all entries that were not requested since the cache was loaded
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        for path in set(self.entries) - self.seen:
+            del self.entries[path]
@@ -11,20 +11,36 @@ This is derived form the "sphinx-apidoc" script, which is:
   Copyright 2007-2014 by the Sphinx team, see http://sphinx-doc.org/latest/authors.html.
 """
 import os
+import sys
+import gc
+import hashlib
 import inspect
+import json
 import pkgutil
-import pkg_resources
+import re
 import shutil
+import time
 
 import jinja2
-from sphinx.util.osutil import walk
 from sphinx.util import logging
+from sphinx.util.inspect import safe_getattr
+from sphinx.ext import autodoc
 from sphinx.ext import autosummary
+from sphinx.ext.autosummary import generate as autosummary_generate
+
+from jinjaapidoc import cache as ctxcache
+from jinjaapidoc import inventory as apiinventory
+from jinjaapidoc import isolate
+from jinjaapidoc import parallel
+from jinjaapidoc import static
+from jinjaapidoc import timing
+from jinjaapidoc import writer as filewriter
 
 logger = logging.getLogger(__name__)
 
 INITPY = '__init__.py'
 PY_SUFFIXES = set(['.py', '.pyx'])
+STUB_SUFFIX = '.pyi'
 TEMPLATE_DIR = 'templates'
 """Built-in template dir for jinjaapi rendering"""
 AUTOSUMMARYTEMPLATE_DIR = 'autosummarytemplates'
@@ -33,6 +49,33 @@ MODULE_TEMPLATE_NAME = 'jinjaapi_module.rst'
 """Name of the template that is used for rendering modules."""
 PACKAGE_TEMPLATE_NAME = 'jinjaapi_package.rst'
 """Name of the template that is used for rendering packages."""
+PAGE_TEMPLATE_NAME = 'jinjaapi_page.rst'
+"""Name of the template that is used for rendering the pages of large modules and packages."""
+PAGE_GROUPINGS = ('chunk', 'alphabet', 'origin')
+"""Values of ``jinjaapi_page_grouping``, see :func:`get_pages`."""
+CLASS_TEMPLATE_NAME = 'autosummary/%s.rst'
+"""Name of the template that is used for rendering classes like autosummary. ``%s`` is the object type."""
+BASE_TEMPLATE_NAME = 'autosummary/base.rst'
+"""Name of the template that is used for rendering classes if there is none for the object type."""
+AUTOSUMMARY_BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(autosummary.__file__)), 'templates')
+"""The templates of autosummary, used if neither the user nor jinjaapidoc provide one."""
+CREATED = 'created'
+"""Outcome of :func:`write_file` for a new file."""
+UPDATED = 'updated'
+"""Outcome of :func:`write_file` for an existing file with new content."""
+UNCHANGED = 'unchanged'
+"""Outcome of :func:`write_file` for an existing file with identical content."""
+SKIPPED = 'skipped'
+"""Outcome of :func:`write_file` if nothing was written because of dryrun or force."""
+DELETED = 'deleted'
+"""Outcome of :func:`sync_dir` for a file of a module that does not exist anymore."""
+MANIFEST_FILENAME = '.jinjaapidoc-manifest.json'
+"""Name of the file in the output directory that lists the generated files."""
+TEMPLATE_CACHE_DIR = 'jinjaapidoc-templates'
+"""Name of the directory inside the sphinx doctree directory for compiled templates."""
+
+_results = {}
+"""The fingerprint, report and output stamps of the generations in this process by :func:`get_result_key`."""
 
 
 def prepare_dir(app, directory, delete=False):
@@ -60,28 +103,191 @@ def prepare_dir(app, directory, delete=False):
         os.mkdir(directory)
 
 
-def make_loader(template_dirs):
+def read_manifest(directory):
+    """Return the files listed in the manifest of the output directory
+
+    :param directory: the output directory
+    :type directory: str
+    :returns: the file names relative to the directory. Empty if there is no manifest.
+    :rtype: :class:`list`
+    :raises: None
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'r') as f:
+            return json.load(f)['files']
+    except (IOError, OSError, ValueError, KeyError):
+        return []
+
+
+def write_manifest(directory, files):
+    """Write the manifest of the output directory
+
+    :param directory: the output directory
+    :type directory: str
+    :param files: the file names relative to the directory
+    :type files: :class:`list`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w') as f:
+        json.dump({'files': sorted(files)}, f, indent=1)
+
+
+def sync_dir(app, directory, report):
+    """Delete files of the last run that were not generated this time and update the manifest.
+
+    For every deleted file, the directory with the same name is deleted as well.
+    It contains the autosummary files of the module.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param directory: the output directory
+    :type directory: str
+    :param report: the report of the current run
+    :type report: :class:`GenerationReport`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    current = set(os.path.relpath(fname, directory)
+                  for status in (CREATED, UPDATED, UNCHANGED, SKIPPED)
+                  for fname in report.files[status])
+    for relpath in sorted(set(read_manifest(directory)) - current):
+        fname = os.path.join(directory, relpath)
+        if os.path.isfile(fname):
+            logger.info('Deleting stale file %s.', fname)
+            os.remove(fname)
+            report.add(DELETED, fname)
+        subdir = os.path.splitext(fname)[0]
+        if os.path.isdir(subdir):
+            logger.debug('Deleting stale dir %s', subdir)
+            shutil.rmtree(subdir)
+    write_manifest(directory, current)
+
+
+def make_loader(template_dirs, compiled_dir=None):
     """Return a new :class:`jinja2.FileSystemLoader` that uses the template_dirs
 
+    If compiled_dir is given, the built-in templates are loaded from the
+    precompiled modules in that directory instead, see :func:`precompile_templates`.
+    User templates still take precedence. The templates of autosummary are searched last.
+
     :param template_dirs: directories to search for templates
     :type template_dirs: None | :class:`list`
+    :param compiled_dir: directory with the precompiled built-in templates
+    :type compiled_dir: None | :class:`str`
     :returns: a new loader
-    :rtype: :class:`jinja2.FileSystemLoader`
+    :rtype: :class:`jinja2.BaseLoader`
     :raises: None
     """
-    return jinja2.FileSystemLoader(searchpath=template_dirs)
+    if not compiled_dir:
+        return jinja2.FileSystemLoader(searchpath=list(template_dirs or []) + [AUTOSUMMARY_BUILTIN_DIR])
+    builtin = os.path.normpath(get_template_dir(TEMPLATE_DIR))
+    user_dirs = [d for d in template_dirs or [] if os.path.normpath(d) != builtin]
+    return jinja2.ChoiceLoader([jinja2.FileSystemLoader(searchpath=user_dirs),
+                                jinja2.ModuleLoader(compiled_dir),
+                                jinja2.FileSystemLoader(searchpath=[AUTOSUMMARY_BUILTIN_DIR])])
 
 
-def make_environment(loader):
+def make_environment(loader, bytecode_cache=None):
     """Return a new :class:`jinja2.Environment` with the given loader
 
+    Templates are not reloaded when their source changes during a run.
+    The ``underline`` filter of the autosummary templates is available.
+
     :param loader: a jinja2 loader
     :type loader: :class:`jinja2.BaseLoader`
+    :param bytecode_cache: cache for the compiled templates
+    :type bytecode_cache: :class:`jinja2.BytecodeCache` | None
+    :returns: a new environment
+    :rtype: :class:`jinja2.Environment`
+    :raises: None
+    """
+    env = jinja2.Environment(loader=loader, bytecode_cache=bytecode_cache, auto_reload=False)
+    env.filters['underline'] = underline
+    return env
+
+
+def underline(title, line='='):
+    """Return the title underlined with the given character
+
+    :param title: the title
+    :type title: :class:`str`
+    :param line: the character
+    :type line: :class:`str`
+    :returns: the title and the underline
+    :rtype: :class:`str`
+    :raises: None
+    """
+    return title + '\n' + line * len(title)
+
+
+def get_template_dir(name):
+    """Return the path to the given template directory of jinjaapidoc
+
+    :param name: :data:`TEMPLATE_DIR` or :data:`AUTOSUMMARYTEMPLATE_DIR`
+    :type name: :class:`str`
+    :returns: the path
+    :rtype: :class:`str`
+    :raises: None
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+def precompile_templates(directory):
+    """Compile the built-in templates to python modules in the given directory
+
+    The modules are stored in a subdirectory named after a hash of the jinja
+    version and the template sources. If it already exists, nothing is compiled.
+
+    :param directory: the directory for compiled templates
+    :type directory: :class:`str`
+    :returns: the directory with the compiled modules, for :func:`make_loader`
+    :rtype: :class:`str`
+    :raises: None
+    """
+    builtin = get_template_dir(TEMPLATE_DIR)
+    key = hashlib.sha1(jinja2.__version__.encode('utf-8'))
+    for name in sorted(os.listdir(builtin)):
+        with open(os.path.join(builtin, name), 'rb') as f:
+            key.update(name.encode('utf-8'))
+            key.update(f.read())
+    target = os.path.join(directory, 'compiled-' + key.hexdigest())
+    if not os.path.isdir(target):
+        logger.debug('Precompiling templates to %s', target)
+        env = make_environment(make_loader([builtin]))
+        tmp = '%s.%s.tmp' % (target, os.getpid())
+        env.compile_templates(tmp, zip=None, ignore_errors=False)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # compiled by another process in the meantime
+            shutil.rmtree(tmp)
+    return target
+
+
+def create_environment(template_dirs, cache_dir=None, precompile=False):
+    """Return a new :class:`jinja2.Environment` for the template_dirs
+
+    :param template_dirs: directories to search for templates
+    :type template_dirs: None | :class:`list`
+    :param cache_dir: directory to cache compiled templates in. None disables caching.
+    :type cache_dir: None | :class:`str`
+    :param precompile: load the built-in templates from modules precompiled into the cache_dir
+    :type precompile: :class:`bool`
     :returns: a new environment
     :rtype: :class:`jinja2.Environment`
     :raises: None
     """
-    return jinja2.Environment(loader=loader)
+    if not cache_dir:
+        return make_environment(make_loader(template_dirs))
+    bytecode_dir = os.path.join(cache_dir, 'bytecode')
+    if not os.path.isdir(bytecode_dir):
+        os.makedirs(bytecode_dir)
+    compiled_dir = precompile_templates(cache_dir) if precompile else None
+    return make_environment(make_loader(template_dirs, compiled_dir),
+                            jinja2.FileSystemBytecodeCache(bytecode_dir))
 
 
 def makename(package, module):
@@ -108,9 +314,16 @@ def makename(package, module):
     return name
 
 
-def write_file(app, name, text, dest, suffix, dryrun, force):
+def write_file(app, name, text, dest, suffix, dryrun, force, report=None, writer=None):
     """Write the output file for module/package <name>.
 
+    If the file already exists with exactly the same content, it is left
+    untouched, so its modification time stays the same and Sphinx does not
+    consider the document outdated.
+
+    If a writer is given, the file is only queued. The document is registered
+    and the outcome recorded once it is written, see :func:`finish_write`.
+
     :param app: the sphinx app
     :type app: :class:`sphinx.application.Sphinx`
     :param name: the file name without file extension
@@ -125,28 +338,214 @@ def write_file(app, name, text, dest, suffix, dryrun, force):
     :type dryrun: :class:`bool`
     :param force: Overwrite existing files
     :type force: :class:`bool`
-    :returns: None
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :param writer: the writer to queue the file in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :returns: the outcome, one of :data:`CREATED`, :data:`UPDATED`, :data:`UNCHANGED`, :data:`SKIPPED`,
+              or None if the file was queued
+    :rtype: :class:`str` | None
     :raises: None
     """
     fname = os.path.join(dest, '%s.%s' % (name, suffix))
+    data = text.encode('utf-8')
+    if writer is not None:
+        writer.submit(name, fname, data, dryrun, force)
+        return None
+    with timing.phase('write', name):
+        status = _write_file(fname, data, dryrun, force)
+    finish_write(app, fname, status, report)
+    return status
+
+
+def finish_write(app, fname, status, report=None):
+    """Register the written file in the sphinx environment and record the outcome
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param fname: path to the file
+    :type fname: :class:`str`
+    :param status: the outcome of :func:`write_file`
+    :type status: :class:`str`
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    if status in (CREATED, UPDATED, UNCHANGED):
+        add_found_doc(app, fname)
+    if report is not None:
+        report.add(status, fname)
+
+
+def _write_file(fname, data, dryrun, force):
+    """Write the file and return the outcome. See :func:`write_file`."""
+    exists = os.path.isfile(fname)
     if dryrun:
         logger.info('Would create file %s.' % fname)
-        return
-    if not force and os.path.isfile(fname):
+        status = SKIPPED
+    elif exists and not force:
         logger.info('File %s already exists, skipping.' % fname)
+        status = SKIPPED
+    elif exists and is_same_content(fname, data):
+        logger.debug('File %s is up to date.' % fname)
+        status = UNCHANGED
     else:
         logger.info('Creating file %s.' % fname)
-        f = open(fname, 'w')
-        try:
-            f.write(text)
-            relpath = os.path.relpath(fname, start=app.env.srcdir)
-            abspath = os.sep + relpath
-            docpath = app.env.relfn2path(abspath)[0]
-            docpath = docpath.rsplit(os.path.extsep, 1)[0]
-            logger.debug('Adding document %s' % docpath)
-            app.env.found_docs.add(docpath)
-        finally:
-            f.close()
+        with open(fname, 'wb') as f:
+            f.write(data)
+        status = UPDATED if exists else CREATED
+    return status
+
+
+def is_same_content(fname, data):
+    """Return True if the file contains exactly the given data.
+
+    The file size is compared first, so only files of equal size are read.
+
+    :param fname: path to an existing file
+    :type fname: :class:`str`
+    :param data: the new content
+    :type data: :class:`bytes`
+    :returns: True if the content is the same
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    try:
+        if os.path.getsize(fname) != len(data):
+            return False
+        with open(fname, 'rb') as f:
+            return f.read() == data
+    except (IOError, OSError):
+        return False
+
+
+def add_found_doc(app, fname):
+    """Register the given file as document in the sphinx environment.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param fname: path to the generated file
+    :type fname: :class:`str`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    docpath = get_docname(app, fname)
+    logger.debug('Adding document %s' % docpath)
+    app.env.found_docs.add(docpath)
+
+
+def get_docname(app, fname):
+    """Return the sphinx document name of the given file
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param fname: path to the generated file
+    :type fname: :class:`str`
+    :returns: the document name
+    :rtype: :class:`str`
+    :raises: None
+    """
+    relpath = os.path.relpath(fname, start=app.env.srcdir)
+    abspath = os.sep + relpath
+    docpath = app.env.relfn2path(abspath)[0]
+    return docpath.rsplit(os.path.extsep, 1)[0]
+
+
+class GenerationReport(object):
+    """Collects the outcome of every file written by :func:`write_file`."""
+
+    def __init__(self, collect=False):
+        """Initialize an empty report
+
+        :param collect: collect the records for the inventory, see :meth:`add_context`
+        :type collect: :class:`bool`
+        :raises: None
+        """
+        self.files = {CREATED: [], UPDATED: [], UNCHANGED: [], SKIPPED: [], DELETED: []}
+        self.classpages = []
+        self.records = {} if collect else None
+        self.failures = []
+
+    def add(self, status, fname):
+        """Record the outcome for the given file
+
+        :param status: the outcome of :func:`write_file` or :func:`sync_dir`
+        :type status: :class:`str`
+        :param fname: the path of the file
+        :type fname: :class:`str`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.files[status].append(fname)
+
+    def count(self, status):
+        """Return the number of files with the given outcome
+
+        :param status: the outcome of :func:`write_file`
+        :type status: :class:`str`
+        :returns: the number of files
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return len(self.files[status])
+
+    def summary(self):
+        """Return a one line summary of the report
+
+        :returns: the summary
+        :rtype: :class:`str`
+        :raises: None
+        """
+        return '%s created, %s updated, %s unchanged, %s skipped, %s deleted' % (
+            self.count(CREATED), self.count(UPDATED), self.count(UNCHANGED), self.count(SKIPPED),
+            self.count(DELETED))
+
+    def changes(self, app):
+        """Return the document names of the created, updated and deleted files
+
+        :param app: the sphinx app
+        :type app: :class:`sphinx.application.Sphinx`
+        :returns: the added, changed and removed document names
+        :rtype: :class:`tuple` of :class:`set`
+        :raises: None
+        """
+        return tuple(set(get_docname(app, fname) for fname in self.files[status])
+                     for status in (CREATED, UPDATED, DELETED))
+
+    def add_context(self, var, ispkg, path):
+        """Record the context of a module for the inventory if the report collects them
+
+        Modules with the empty context of a failed import are added to :attr:`failures`.
+
+        :param var: the context
+        :type var: :class:`dict`
+        :param ispkg: True for packages
+        :type ispkg: :class:`bool`
+        :param path: the path to the module file or package directory
+        :type path: :class:`str` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if var.get('failed'):
+            self.failures.append(var['fullname'])
+        if self.records is not None:
+            self.records[var['fullname']] = apiinventory.make_record(var, ispkg, path)
+
+    def add_classpages(self, fname):
+        """Record that the class pages of the given file were generated, see :func:`create_class_files`
+
+        :param fname: the path of the module or package file
+        :type fname: :class:`str`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.classpages.append(fname)
 
 
 def import_name(app, name):
@@ -160,26 +559,142 @@ def import_name(app, name):
     """
     try:
         logger.debug('Importing %r', name)
-        name, obj = autosummary.import_by_name(name)[:2]
+        with timing.phase('import', name), timing.profile_import(name):
+            name, obj = autosummary.import_by_name(name)[:2]
         logger.debug('Imported %s', obj)
         return obj
     except ImportError as e:
         logger.warn("Jinjapidoc failed to import %r: %s", name, e)
 
 
-def get_members(app, mod, typ, include_public=None):
-    """Return the members of mod of the given type
+def unload_module(name):
+    """Remove the module from :data:`sys.modules` and from its parent package
+
+    The next import executes the module again.
+
+    :param name: the module name
+    :type name: :class:`str`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    mod = sys.modules.pop(name, None)
+    parent, _, child = name.rpartition('.')
+    if mod is not None and parent in sys.modules and getattr(sys.modules[parent], child, None) is mod:
+        delattr(sys.modules[parent], child)
+
+
+class ModuleEvictor(object):
+    """Removes modules that were imported for introspection from :data:`sys.modules`.
+
+    Only modules of the documented packages that were not imported before
+    the evictor was created are removed, so peak memory is bounded by the
+    largest package instead of the whole tree. The parent packages of the
+    current package are kept, so they are not imported again for every
+    subpackage. Autodoc imports the modules again when sphinx reads the
+    generated files.
+    """
+
+    def __init__(self):
+        """Initialize a new evictor and remember the currently imported modules
+
+        :raises: None
+        """
+        self.before = set(sys.modules)
+        self.evicted = 0
+
+    def evict(self, fullname):
+        """Remove the new modules of the toplevel package except the parents of the given module
+
+        :param fullname: the name of a documented package or module
+        :type fullname: :class:`str`
+        :returns: the number of removed modules
+        :rtype: :class:`int`
+        :raises: None
+        """
+        parts = fullname.split('.')
+        root = parts[0]
+        keep = set('.'.join(parts[:i]) for i in range(1, len(parts)))
+        names = [name for name in sys.modules
+                 if name not in self.before and name not in keep and (name == root or name.startswith(root + '.'))]
+        if not names:
+            return 0
+        with timing.phase('evict', fullname):
+            for name in names:
+                unload_module(name)
+            # functions and their module dict form reference cycles
+            gc.collect()
+        logger.debug('Evicted %s modules of %s', len(names), root)
+        self.evicted += len(names)
+        return len(names)
+
+
+class MemberInventory(object):
+    """The names of all members of a module, classified by type.
+
+    Created by :func:`get_inventory` in a single pass over the module.
+    """
+    __slots__ = ('classes', 'exceptions', 'functions', 'data', 'members', 'include_public')
+
+    TYPES = {'class': 'classes',
+             'exception': 'exceptions',
+             'function': 'functions',
+             'data': 'data',
+             'members': 'members'}
+    """Maps the types of :func:`get_members` to the attributes."""
+
+    def __init__(self, include_public=None):
+        """Initialize an empty inventory
+
+        :param include_public: list of private members to include to publics
+        :type include_public: list | None
+        :raises: None
+        """
+        self.classes = []
+        self.exceptions = []
+        self.functions = []
+        self.data = []
+        self.members = []
+        self.include_public = include_public or []
+
+    def public(self, names):
+        """Return the public names of the given names
+
+        :param names: the names to filter
+        :type names: :class:`list`
+        :returns: the public names
+        :rtype: :class:`list`
+        :raises: None
+        """
+        return [x for x in names if x in self.include_public or not x.startswith('_')]
+
+    def get(self, typ):
+        """Return the public and all members of the given type
+
+        :param typ: the typ, ``'class'``, ``'function'``, ``'exception'``, ``'data'``, ``'members'``
+        :type typ: str
+        :returns: public members and all members
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        attr = self.TYPES.get(typ)
+        if attr is None:
+            return [], []
+        items = getattr(self, attr)
+        return self.public(items), items
+
+
+def get_inventory(app, mod, include_public=None):
+    """Return the members of mod classified by type
 
     :param app: the sphinx app
     :type app: :class:`sphinx.application.Sphinx`
     :param mod: the module with members
     :type mod: module
-    :param typ: the typ, ``'class'``, ``'function'``, ``'exception'``, ``'data'``, ``'members'``
-    :type typ: str
     :param include_public: list of private members to include to publics
     :type include_public: list | None
-    :returns: None
-    :rtype: None
+    :returns: the inventory
+    :rtype: :class:`MemberInventory`
     :raises: None
     """
     def include_here(x):
@@ -199,23 +714,125 @@ def get_members(app, mod, typ, include_public=None):
     all_list = getattr(mod, '__all__', [])
     include_from_all = app.config.jinjaapi_include_from_all
 
-    include_public = include_public or []
-    tests = {'class': lambda x: inspect.isclass(x) and not issubclass(x, BaseException) and include_here(x),
-             'function': lambda x: inspect.isfunction(x) and include_here(x),
-             'exception': lambda x: inspect.isclass(x) and issubclass(x, BaseException) and include_here(x),
-             'data': lambda x: not inspect.ismodule(x) and not inspect.isclass(x) and not inspect.isfunction(x),
-             'members': lambda x: True}
-    items = []
+    with timing.phase('classify', mod.__name__):
+        return _get_inventory(mod, include_public, include_here)
+
+
+def _get_inventory(mod, include_public, include_here):
+    """Classify the members of mod. See :func:`get_inventory`."""
+    inventory = MemberInventory(include_public)
     for name in dir(mod):
         i = getattr(mod, name)
-        inspect.ismodule(i)
+        inventory.members.append(name)
+        if inspect.isclass(i):
+            if include_here(i):
+                if issubclass(i, BaseException):
+                    inventory.exceptions.append(name)
+                else:
+                    inventory.classes.append(name)
+        elif inspect.isfunction(i):
+            if include_here(i):
+                inventory.functions.append(name)
+        elif not inspect.ismodule(i):
+            inventory.data.append(name)
+    logger.debug('Got members of %s: classes %s, exceptions %s, functions %s and data %s', mod,
+                 inventory.classes, inventory.exceptions, inventory.functions, inventory.data)
+    return inventory
+
+
+def get_members(app, mod, typ, include_public=None):
+    """Return the members of mod of the given type
+
+    Use :func:`get_inventory` to get the members of all types at once.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param mod: the module with members
+    :type mod: module
+    :param typ: the typ, ``'class'``, ``'function'``, ``'exception'``, ``'data'``, ``'members'``
+    :type typ: str
+    :param include_public: list of private members to include to publics
+    :type include_public: list | None
+    :returns: public members and all members
+    :rtype: :class:`tuple`
+    :raises: None
+    """
+    return get_inventory(app, mod, include_public).get(typ)
+
+
+def get_member_type(member, name):
+    """Return the autosummary type of a class member
+
+    The documenters of autodoc decide in the same order as in
+    :func:`sphinx.ext.autosummary.get_documenter`.
+
+    :param member: the member
+    :param name: the name of the member
+    :type name: :class:`str`
+    :returns: ``'attribute'``, ``'method'`` or None for nested classes
+    :rtype: :class:`str` | None
+    :raises: None
+    """
+    if inspect.isclass(member):
+        return None
+    if autodoc.AttributeDocumenter.can_document_member(member, name, False, None):
+        return 'attribute'
+    if autodoc.MethodDocumenter.can_document_member(member, name, False, None):
+        return 'method'
+    return None
+
+
+def get_class_members(cls):
+    """Return the variables for the class template like autosummary
+
+    :param cls: the class
+    :type cls: :class:`type`
+    :returns: ``members``, ``inherited_members``, ``methods``, ``all_methods``,
+              ``attributes`` and ``all_attributes``
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    members = dir(cls)
+    items = {'method': [], 'attribute': []}
+    for name in members:
+        try:
+            value = safe_getattr(cls, name)
+        except AttributeError:
+            continue
+        typ = get_member_type(value, name)
+        if typ is not None:
+            items[typ].append(name)
+    var = {'members': members,
+           'inherited_members': sorted(set(members) - set(cls.__dict__))}
+    for typ, key, include_public in (('method', 'methods', ['__init__']), ('attribute', 'attributes', [])):
+        var[key] = [x for x in items[typ] if x in include_public or not x.startswith('_')]
+        var['all_' + key] = items[typ]
+    return var
+
 
-        if tests.get(typ, lambda x: False)(i):
-            items.append(name)
-    public = [x for x in items
-              if x in include_public or not x.startswith('_')]
-    logger.debug('Got members of %s of type %s: public %s and %s', mod, typ, public, items)
-    return public, items
+def get_classes_members(app, mod, classes, exceptions):
+    """Return the variables for the class template of the given classes of mod
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param mod: the module with the classes
+    :type mod: module
+    :param classes: the names of the classes
+    :type classes: :class:`list`
+    :param exceptions: the names of the exceptions
+    :type exceptions: :class:`list`
+    :returns: the variables of :func:`get_class_members` and the ``objtype`` by class name
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    members = {}
+    with timing.phase('classes', mod.__name__):
+        for objtype, names in (('class', classes), ('exception', exceptions)):
+            for name in names:
+                var = get_class_members(getattr(mod, name))
+                var['objtype'] = objtype
+                members[name] = var
+    return members
 
 
 def _get_submodules(app, module):
@@ -235,11 +852,12 @@ def _get_submodules(app, module):
         else:
             return []
     elif isinstance(module, str):
-        p = module
+        p = [module]
     else:
         raise TypeError("Only Module or String accepted. %s given." % type(module))
     logger.debug('Getting submodules of %s', p)
-    submodules = [(name, ispkg) for loader, name, ispkg in pkgutil.iter_modules(p)]
+    with timing.phase('submodules', getattr(module, '__name__', module)):
+        submodules = [(name, ispkg) for loader, name, ispkg in pkgutil.iter_modules(p)]
     logger.debug('Found submodules of %s: %s', module, submodules)
     return submodules
 
@@ -274,7 +892,261 @@ def get_subpackages(app, module):
     return [name for name, ispkg in submodules if ispkg]
 
 
-def get_context(app, package, module, fullname):
+def get_page_key(grouping, name, origins):
+    """Return the key of the page the member belongs to
+
+    :param grouping: ``'alphabet'`` or ``'origin'``
+    :type grouping: :class:`str`
+    :param name: the name of the member
+    :type name: :class:`str`
+    :param origins: the modules the members are defined in by name
+    :type origins: :class:`dict`
+    :returns: the key
+    :rtype: :class:`str`
+    :raises: None
+    """
+    if grouping == 'alphabet':
+        return (name.lstrip('_')[:1] or '_').upper()
+    return origins.get(name) or '_'
+
+
+def get_pages(app, var, origins=None):
+    """Return the pages to split the functions and data of a large module into
+
+    If a module has more public functions and data than ``jinjaapi_page_size``,
+    they are grouped according to ``jinjaapi_page_grouping``:
+
+      * ``'chunk'``: pages with at most ``jinjaapi_page_size`` members
+      * ``'alphabet'``: a page per first letter
+      * ``'origin'``: a page per module the members are defined in,
+        e.g. for modules that import their functions from private submodules
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param var: the context with the functions and data
+    :type var: :class:`dict`
+    :param origins: the modules the members are defined in by name. Members
+                    without origin are grouped into the page of the module itself.
+                    If None, e.g. for static analysis, ``'origin'`` falls back to ``'chunk'``.
+    :type origins: :class:`dict` | None
+    :returns: dicts with the ``name`` of the file without suffix, the ``title`` and
+              the ``functions`` and ``data`` of each page. Empty if the module is small.
+    :rtype: :class:`list`
+    :raises: None
+    """
+    size = app.config.jinjaapi_page_size
+    members = [('functions', n) for n in var['functions']] + [('data', n) for n in var['data']]
+    if not size or len(members) <= size:
+        return []
+    grouping = app.config.jinjaapi_page_grouping
+    if grouping == 'origin' and origins is None:
+        logger.warning('jinjaapidoc: the origins of the members of %s are unknown without importing it, '
+                       'splitting it into chunks instead.', var['fullname'])
+        grouping = 'chunk'
+    groups = []
+    if grouping in ('alphabet', 'origin'):
+        origins = dict(origins or {})
+        for name in var['data']:
+            origins.setdefault(name, var['fullname'])
+        keys = {}
+        for kind, name in members:
+            key = get_page_key(grouping, name, origins)
+            if key not in keys:
+                keys[key] = []
+                groups.append((key, key, keys[key]))
+            keys[key].append((kind, name))
+        groups.sort()
+    else:
+        for i in range(0, len(members), size):
+            chunk = members[i:i + size]
+            groups.append((str(i // size + 1), '%s - %s' % (chunk[0][1], chunk[-1][1]), chunk))
+    pages = []
+    for key, title, chunk in groups:
+        page = {'name': '%s-%s' % (var['fullname'], key), 'title': title, 'functions': [], 'data': []}
+        for kind, name in chunk:
+            page[kind].append(name)
+        pages.append(page)
+    return pages
+
+
+def get_origins(mod, names):
+    """Return the names of the modules the given members of mod are defined in
+
+    :param mod: the module
+    :type mod: module
+    :param names: the names of the members
+    :type names: :class:`list`
+    :returns: the module names by member name
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    return dict((name, getattr(getattr(mod, name), '__module__', None)) for name in names)
+
+
+def get_depends(mod, names):
+    """Return the source files of the other modules the given members of mod are taken from
+
+    Members that are re-exported from other modules of the same top level
+    package, e.g. with ``from .core import *``, change if those modules change.
+    Classes and functions are traced by their ``__module__``, other objects by
+    looking them up under the same name in the loaded modules.
+
+    :param mod: the module
+    :type mod: module
+    :param names: the names of the members
+    :type names: :class:`list`
+    :returns: the paths of the source files
+    :rtype: :class:`list`
+    :raises: None
+    """
+    own = mod.__name__
+    top = own.split('.')[0]
+    modules = dict((name, m) for name, m in list(sys.modules.items())
+                   if m is not None and name != own and (name == top or name.startswith(top + '.')))
+    found = set()
+    for name in names:
+        value = safe_getattr(mod, name, None)
+        if value is None or value is True or value is False:
+            continue
+        origin = getattr(value, '__module__', None) if inspect.isclass(value) or inspect.isroutine(value) else None
+        if origin in modules:
+            found.add(origin)
+            continue
+        for other, m in modules.items():
+            if other not in found and getattr(m, '__dict__', {}).get(name) is value:
+                found.add(other)
+    files = set(getattr(modules[name], '__file__', None) for name in found)
+    return sorted(f for f in files if f and os.path.isfile(f))
+
+
+def get_static_source(app, path):
+    """Return the file to analyse statically instead of importing the module
+
+    If ``jinjaapi_stubs`` is True, a ``.pyi`` stub next to the module and
+    cython sources are used. If ``jinjaapi_static_analysis`` is True, the source is used.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param path: the path to the module file or package directory
+    :type path: str
+    :returns: the path of the file or None if the module has to be imported
+    :rtype: str | None
+    :raises: None
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, INITPY)
+    if app.config.jinjaapi_stubs:
+        stub = os.path.splitext(path)[0] + STUB_SUFFIX
+        if os.path.isfile(stub):
+            return stub
+        if path.endswith('.pyx'):
+            return path
+    if app.config.jinjaapi_static_analysis:
+        return path
+    return None
+
+
+def is_cacheable(app, fullname, path):
+    """Return True if the context of the module can be cached
+
+    Contexts of modules that could not be imported are not cached. Contexts from
+    static analysis always are.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param fullname: package.module
+    :type fullname: str
+    :param path: the path to the module file or package directory
+    :type path: str | None
+    :returns: True if the context can be cached
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    return fullname in sys.modules or bool(path and get_static_source(app, path))
+
+
+def get_static_context(app, package, module, fullname, path, entry=None):
+    """Return a dict for template rendering by parsing the source of the module
+
+    See :func:`get_context` for the variables. Imported names, aliases and
+    names that are bound to different kinds in conditional branches cannot be
+    classified statically, see :meth:`static.ModuleInfo.bind`. Imported names
+    are not listed, the others are classified by their last binding, e.g.
+    aliases and results of calls as data. Only if such names are listed in
+    ``__all__``, the module is imported and their kinds are taken from
+    :func:`get_inventory`, unless the context is created from a stub or cython
+    source, see :func:`get_static_source`.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param package: the parent package name
+    :type package: str
+    :param module: the module name
+    :type module: str
+    :param fullname: package.module
+    :type fullname: str
+    :param path: the path to the module file or package directory
+    :type path: str
+    :param entry: the index entry of the package
+    :type entry: :class:`PackageEntry` | None
+    :returns: a dict with variables for template rendering or None if the source cannot be analysed
+    :rtype: :class:`dict` | None
+    :raises: None
+    """
+    ispkg = os.path.isdir(path)
+    source = get_static_source(app, path)
+    if source is None:
+        return None
+    with timing.phase('static', fullname):
+        info = static.parse(source)
+    if info is None:
+        return None
+    logger.debug('Creating static context for: package %s, module %s, fullname %s', package, module, fullname)
+    attributes = set(static.MODULE_ATTRIBUTES)
+    if ispkg:
+        attributes.add('__path__')
+    kinds = {'class': set(info.classes),
+             'exception': set(info.exceptions),
+             'function': set(info.functions),
+             'data': info.data | attributes}
+    unresolved = info.unresolved.intersection(info.all or []) if source.endswith('.py') else set()
+    depends = []
+    if unresolved:
+        logger.debug('Importing %s to resolve %s', fullname, sorted(unresolved))
+        obj = import_name(app, fullname)
+        if obj:
+            inventory = get_inventory(app, obj)
+            for typ, names in kinds.items():
+                names.difference_update(unresolved)
+                names.update(unresolved.intersection(inventory.get(typ)[1]))
+            depends = get_depends(obj, sorted(unresolved))
+
+    def public(names):
+        return [x for x in names if not x.startswith('_')]
+
+    var = {'package': package,
+           'module': module,
+           'fullname': fullname}
+    if entry is not None:
+        var['subpkgs'], var['submods'] = list(entry.subpkgs), list(entry.submods)
+    elif ispkg:
+        var['subpkgs'] = get_subpackages(app, path)
+        var['submods'] = get_submodules(app, path)
+    else:
+        var['subpkgs'] = var['submods'] = []
+    for typ, key in (('class', 'classes'), ('exception', 'exceptions'),
+                     ('function', 'functions'), ('data', 'data')):
+        items = sorted(kinds[typ])
+        var[key], var['all' + key] = public(items), items
+    items = sorted(info.names() | attributes)
+    var['members'] = (public(items), items)
+    var['pages'] = get_pages(app, var)
+    var['depends'] = depends
+    logger.debug('Created context: %s', var)
+    return var
+
+
+def get_context(app, package, module, fullname, path=None, entry=None):
     """Return a dict for template rendering
 
     Variables:
@@ -293,6 +1165,11 @@ def get_context(app, package, module, fullname):
       * :data: public data in module
       * :alldata: public and private data in module
       * :members: dir(module)
+      * :classmembers: the variables for the class pages by class name, see :func:`get_classes_members`.
+                       Only if ``jinjaapi_generate_classes`` is True.
+      * :pages: the pages of the functions and data of large modules, see :func:`get_pages`
+      * :depends: the source files of other modules the members are taken from, see :func:`get_depends`.
+                  The context cache stamps them as well.
 
 
     :param app: the sphinx app
@@ -303,34 +1180,285 @@ def get_context(app, package, module, fullname):
     :type module: str
     :param fullname: package.module
     :type fullname: str
+    :param path: the path to the module file or package directory. Required for static analysis.
+    :type path: str | None
+    :param entry: the index entry of the package. If given, the subpackages and
+                  submodules are taken from it instead of listing the directory again.
+    :type entry: :class:`PackageEntry` | None
     :returns: a dict with variables for template rendering
     :rtype: :class:`dict`
     :raises: None
     """
+    if path and (app.config.jinjaapi_static_analysis or app.config.jinjaapi_stubs):
+        var = get_static_context(app, package, module, fullname, path, entry)
+        if var is not None:
+            return var
     var = {'package': package,
            'module': module,
            'fullname': fullname}
     logger.debug('Creating context for: package %s, module %s, fullname %s', package, module, fullname)
     obj = import_name(app, fullname)
     if not obj:
-        for k in ('subpkgs', 'submods', 'classes', 'allclasses',
-                  'exceptions', 'allexceptions', 'functions', 'allfunctions',
-                  'data', 'alldata', 'memebers'):
-            var[k] = []
-        return var
-
-    var['subpkgs'] = get_subpackages(app, obj)
-    var['submods'] = get_submodules(app, obj)
-    var['classes'], var['allclasses'] = get_members(app, obj, 'class')
-    var['exceptions'], var['allexceptions'] = get_members(app, obj, 'exception')
-    var['functions'], var['allfunctions'] = get_members(app, obj, 'function')
-    var['data'], var['alldata'] = get_members(app, obj, 'data')
-    var['members'] = get_members(app, obj, 'members')
+        return get_empty_context(package, module, fullname)
+
+    if entry is not None:
+        var['subpkgs'], var['submods'] = list(entry.subpkgs), list(entry.submods)
+    else:
+        var['subpkgs'] = get_subpackages(app, obj)
+        var['submods'] = get_submodules(app, obj)
+    inventory = get_inventory(app, obj)
+    var['classes'], var['allclasses'] = inventory.get('class')
+    var['exceptions'], var['allexceptions'] = inventory.get('exception')
+    var['functions'], var['allfunctions'] = inventory.get('function')
+    var['data'], var['alldata'] = inventory.get('data')
+    var['members'] = inventory.get('members')
+    if app.config.jinjaapi_generate_classes:
+        var['classmembers'] = get_classes_members(app, obj, var['allclasses'], var['allexceptions'])
+    origins = get_origins(obj, var['functions']) if app.config.jinjaapi_page_grouping == 'origin' else None
+    var['pages'] = get_pages(app, var, origins)
+    var['depends'] = get_depends(obj, var['allclasses'] + var['allexceptions'] + var['allfunctions'] +
+                                 var['alldata'] + ['__all__'])
     logger.debug('Created context: %s', var)
     return var
 
 
-def create_module_file(app, env, package, module, dest, suffix, dryrun, force):
+def get_empty_context(package, module, fullname):
+    """Return the context for a module that could not be imported
+
+    The context has the additional variable ``failed``, see :meth:`GenerationReport.add_context`.
+
+    :param package: the parent package name
+    :type package: str
+    :param module: the module name
+    :type module: str
+    :param fullname: package.module
+    :type fullname: str
+    :returns: a dict with variables for template rendering
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    var = {'package': package,
+           'module': module,
+           'fullname': fullname}
+    for k in ('subpkgs', 'submods', 'classes', 'allclasses',
+              'exceptions', 'allexceptions', 'functions', 'allfunctions',
+              'data', 'alldata', 'memebers', 'pages', 'depends'):
+        var[k] = []
+    var['failed'] = True
+    return var
+
+
+def get_cached_context(app, package, module, fullname, path, cache, importer=None, entry=None):
+    """Return the context from the cache or create it with :func:`get_context`
+
+    Modules that fail to import are not cached. Contexts from static analysis
+    are always cached. If an importer is given, the context is created in its
+    worker process.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param package: the parent package name
+    :type package: str
+    :param module: the module name
+    :type module: str
+    :param fullname: package.module
+    :type fullname: str
+    :param path: the path to the module file or package directory
+    :type path: str | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param importer: the importer for isolation mode
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :param entry: the index entry of the package
+    :type entry: :class:`PackageEntry` | None
+    :returns: a dict with variables for template rendering
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    if cache is not None and path is not None:
+        var = cache.get(path)
+        if var is not None:
+            logger.debug('Using cached context for %s', fullname)
+            if entry is not None:
+                var['subpkgs'], var['submods'] = list(entry.subpkgs), list(entry.submods)
+            return var
+    if importer is not None:
+        var, cacheable = importer.get_context(package, module, fullname, path, entry)
+    else:
+        var = get_context(app, package, module, fullname, path, entry)
+        cacheable = is_cacheable(app, fullname, path)
+    if cacheable and cache is not None and path is not None:
+        cache.set(path, var)
+    return var
+
+
+def find_module_path(directory, name):
+    """Return the path of the module or package with the given name in directory
+
+    :param directory: the directory to search
+    :type directory: str
+    :param name: the module name without suffix
+    :type name: str
+    :returns: the path to the module file or package directory or None if not found
+    :rtype: str | None
+    :raises: None
+    """
+    path = os.path.join(directory, name)
+    if os.path.isfile(os.path.join(path, INITPY)):
+        return path
+    for suffix in sorted(PY_SUFFIXES):
+        if os.path.isfile(path + suffix):
+            return path + suffix
+    return None
+
+
+def render_context(env, var, ispkg):
+    """Render the module or package template with the given context
+
+    :param env: the jinja environment for the templates
+    :type env: :class:`jinja2.Environment`
+    :param var: the context from :func:`get_context`. ``ispkg`` will be set.
+    :type var: :class:`dict`
+    :param ispkg: True to render the package template
+    :type ispkg: :class:`bool`
+    :returns: the rendered text
+    :rtype: :class:`str`
+    :raises: None
+    """
+    var['ispkg'] = ispkg
+    with timing.phase('render', var['fullname']):
+        template = env.get_template(PACKAGE_TEMPLATE_NAME if ispkg else MODULE_TEMPLATE_NAME)
+        return template.render(var)
+
+
+def get_class_context(module, name, members):
+    """Return the context for the class template like autosummary
+
+    :param module: the name of the module that lists the class
+    :type module: :class:`str`
+    :param name: the class name
+    :type name: :class:`str`
+    :param members: the variables from :func:`get_class_members`
+    :type members: :class:`dict`
+    :returns: the context
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    var = dict(members)
+    fullname = makename(module, name)
+    var.update({'fullname': fullname,
+                'module': module,
+                'objname': name,
+                'name': name,
+                'underline': len(fullname) * '='})
+    return var
+
+
+def create_class_files(app, env, var, text, dest, suffix, dryrun, force, report=None, writer=None):
+    """Write the pages of the classes in the autosummary tables of a rendered module or package
+
+    Like the autosummary generator, every entry of an ``autosummary`` directive with
+    a ``:toctree:`` option gets a page. The members are taken from the context
+    instead of importing and inspecting the classes again.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the jinja environment for the templates
+    :type env: :class:`jinja2.Environment`
+    :param var: the context of the module or package
+    :type var: :class:`dict`
+    :param text: the rendered module or package file
+    :type text: :class:`str`
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :param dryrun: If True, do not create any files, just log the potential location.
+    :type dryrun: :class:`bool`
+    :param force: Overwrite existing files
+    :type force: :class:`bool`
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :param writer: the writer to queue the files in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :returns: True if there is a page for every entry, so autosummary does not have to process the file
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    members = var.get('classmembers')
+    if members is None:
+        return False
+    fullname = var['fullname']
+    fname = os.path.join(dest, '%s.%s' % (fullname, suffix))
+    complete = True
+    entries = autosummary_generate.find_autosummary_in_lines(text.splitlines(), filename=fname)
+    for name, path, template_name in entries:
+        if path is None:
+            continue
+        module, _, clsname = name.rpartition('.')
+        if module != fullname or clsname not in members:
+            complete = False
+            continue
+        ctx = get_class_context(module, clsname, members[clsname])
+        with timing.phase('render', name):
+            if template_name:
+                template = env.get_template(template_name)
+            else:
+                template = env.select_template([CLASS_TEMPLATE_NAME % ctx['objtype'], BASE_TEMPLATE_NAME])
+            rendered = template.render(ctx)
+        if not dryrun and not os.path.isdir(path):
+            os.makedirs(path)
+        write_file(app, os.path.relpath(os.path.join(path, name), dest), rendered, dest, suffix, dryrun, force,
+                   report, writer)
+    if complete and report is not None:
+        report.add_classpages(fname)
+    return complete
+
+
+def create_page_files(app, env, var, dest, suffix, dryrun, force, report=None, writer=None):
+    """Write the pages of the functions and data of a large module or package, see :func:`get_pages`
+
+    The pages are stored in the directory named after the module.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the jinja environment for the templates
+    :type env: :class:`jinja2.Environment`
+    :param var: the context of the module or package
+    :type var: :class:`dict`
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :param dryrun: If True, do not create any files, just log the potential location.
+    :type dryrun: :class:`bool`
+    :param force: Overwrite existing files
+    :type force: :class:`bool`
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :param writer: the writer to queue the files in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    pages = var.get('pages')
+    if not pages:
+        return
+    fullname = var['fullname']
+    directory = os.path.join(dest, fullname)
+    if not dryrun and not os.path.isdir(directory):
+        os.makedirs(directory)
+    template = env.get_template(PAGE_TEMPLATE_NAME)
+    for page in pages:
+        ctx = dict(page, fullname=fullname, package=var['package'], module=var['module'])
+        with timing.phase('render', fullname):
+            rendered = template.render(ctx)
+        write_file(app, os.path.join(fullname, page['name']), rendered, dest, suffix, dryrun, force, report, writer)
+
+
+def create_module_file(app, env, package, module, dest, suffix, dryrun, force, report=None,
+                       cache=None, path=None, importer=None, writer=None):
     """Build the text of the file and write the file.
 
     :param app: the sphinx app
@@ -349,21 +1477,33 @@ def create_module_file(app, env, package, module, dest, suffix, dryrun, force):
     :type dryrun: :class:`bool`
     :param force: Overwrite existing files
     :type force: :class:`bool`
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param path: the path to the module file, used as cache key
+    :type path: :class:`str` | None
+    :param importer: the importer for isolation mode
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :param writer: the writer to queue the file in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
     :returns: None
     :raises: None
     """
     logger.debug('Create module file: package %s, module %s', package, module)
-    template_file = MODULE_TEMPLATE_NAME
-    template = env.get_template(template_file)
     fn = makename(package, module)
-    var = get_context(app, package, module, fn)
-    var['ispkg'] = False
-    rendered = template.render(var)
-    write_file(app, makename(package, module), rendered, dest, suffix, dryrun, force)
+    var = get_cached_context(app, package, module, fn, path, cache, importer)
+    if report is not None:
+        report.add_context(var, False, path)
+    rendered = render_context(env, var, False)
+    write_file(app, makename(package, module), rendered, dest, suffix, dryrun, force, report, writer)
+    create_page_files(app, env, var, dest, suffix, dryrun, force, report, writer)
+    create_class_files(app, env, var, rendered, dest, suffix, dryrun, force, report, writer)
 
 
 def create_package_file(app, env, root_package, sub_package, private,
-                        dest, suffix, dryrun, force):
+                        dest, suffix, dryrun, force, report=None, cache=None, path=None, importer=None,
+                        entry=None, writer=None, submodules=True):
     """Build the text of the file and write the file.
 
     :param app: the sphinx app
@@ -384,21 +1524,42 @@ def create_package_file(app, env, root_package, sub_package, private,
     :type dryrun: :class:`bool`
     :param force: Overwrite existing files
     :type force: :class:`bool`
+    :param report: the report to record the outcome in
+    :type report: :class:`GenerationReport` | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param path: the path to the package directory, used as cache key
+    :type path: :class:`str` | None
+    :param importer: the importer for isolation mode
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :param entry: the index entry of the package. Without it, the submodules are
+                  found by listing the package again.
+    :type entry: :class:`PackageEntry` | None
+    :param writer: the writer to queue the files in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :param submodules: also create the files of the submodules
+    :type submodules: :class:`bool`
     :returns: None
     :raises: None
     """
     logger.debug('Create package file: rootpackage %s, sub_package %s', root_package, sub_package)
-    template_file = PACKAGE_TEMPLATE_NAME
-    template = env.get_template(template_file)
     fn = makename(root_package, sub_package)
-    var = get_context(app, root_package, sub_package, fn)
-    var['ispkg'] = True
-    for submod in var['submods']:
+    var = get_cached_context(app, root_package, sub_package, fn, path, cache, importer, entry)
+    if report is not None:
+        report.add_context(var, True, path)
+    for submod in var['submods'] if submodules else ():
         if shall_skip(app, submod, private):
             continue
-        create_module_file(app, env, fn, submod, dest, suffix, dryrun, force)
-    rendered = template.render(var)
-    write_file(app, fn, rendered, dest, suffix, dryrun, force)
+        if entry is not None:
+            modpath = entry.modpaths.get(submod)
+        else:
+            modpath = find_module_path(path, submod) if path else None
+        create_module_file(app, env, fn, submod, dest, suffix, dryrun, force, report, cache, modpath, importer,
+                           writer)
+    rendered = render_context(env, var, True)
+    write_file(app, fn, rendered, dest, suffix, dryrun, force, report, writer)
+    create_page_files(app, env, var, dest, suffix, dryrun, force, report, writer)
+    create_class_files(app, env, var, rendered, dest, suffix, dryrun, force, report, writer)
 
 
 def shall_skip(app, module, private):
@@ -421,77 +1582,332 @@ def shall_skip(app, module, private):
     return False
 
 
-def recurse_tree(app, env, src, dest, excludes, followlinks, force, dryrun, private, suffix):
-    """Look for every file in the directory tree and create the corresponding
-    ReST files.
+class PackageEntry(object):
+    """The subpackages and submodules of a package that are documented.
+
+    Created by :func:`iter_tree` from the directory listing of the walk.
+    Excluded and skipped modules and packages are not part of it.
+    """
+    __slots__ = ('subpkgs', 'submods', 'modpaths')
+
+    def __init__(self, subpkgs, submods, modpaths):
+        """Initialize a new entry
+
+        :param subpkgs: the names of the subpackages
+        :type subpkgs: :class:`list`
+        :param submods: the names of the submodules
+        :type submods: :class:`list`
+        :param modpaths: the source file of each submodule or None for compiled modules
+        :type modpaths: :class:`dict`
+        :raises: None
+        """
+        self.subpkgs = subpkgs
+        self.submods = submods
+        self.modpaths = modpaths
+
+
+class PackageIndex(object):
+    """The :class:`PackageEntry` of every package found by :func:`iter_tree`, by directory."""
+
+    def __init__(self):
+        """Initialize an empty index
+
+        :raises: None
+        """
+        self.packages = {}
+
+    def add(self, path, entry):
+        """Add the entry of the package in the given directory
+
+        :param path: the package directory
+        :type path: :class:`str`
+        :param entry: the entry
+        :type entry: :class:`PackageEntry`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.packages[path] = entry
+
+    def get(self, path):
+        """Return the entry of the package in the given directory
+
+        :param path: the package directory
+        :type path: :class:`str` | None
+        :returns: the entry or None if the path is not an indexed package
+        :rtype: :class:`PackageEntry` | None
+        :raises: None
+        """
+        return self.packages.get(path)
+
+
+def make_package_entry(app, directory, subs, files, private):
+    """Return the entry of a package from its directory listing
+
+    Modules are found like :func:`pkgutil.iter_modules` does, but only in the given listing.
+    If ``jinjaapi_stubs`` is True, cython sources and stubs count as modules even if
+    there is no compiled extension.
 
     :param app: the sphinx app
     :type app: :class:`sphinx.application.Sphinx`
-    :param env: the jinja environment
-    :type env: :class:`jinja2.Environment`
+    :param directory: the package directory
+    :type directory: :class:`str`
+    :param subs: the names of the subdirectories that are not excluded
+    :type subs: :class:`list`
+    :param files: the names of the files that are not excluded
+    :type files: :class:`list`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :returns: the entry
+    :rtype: :class:`PackageEntry`
+    :raises: None
+    """
+    subpkgs = sorted(sub for sub in subs
+                     if '.' not in sub and os.path.isfile(os.path.join(directory, sub, INITPY)))
+    stubs = app.config.jinjaapi_stubs
+    submods = []
+    modpaths = {}
+    for f in sorted(files):
+        name = inspect.getmodulename(f)
+        base, ext = os.path.splitext(f)
+        if not name and stubs and ext in ('.pyx', STUB_SUFFIX):
+            name = base
+        if not name or name == '__init__' or shall_skip(app, name, private):
+            continue
+        if name not in modpaths:
+            submods.append(name)
+            modpaths[name] = None
+        modpath = modpaths[name]
+        if ext in PY_SUFFIXES and (modpath is None or modpath.endswith(STUB_SUFFIX)):
+            modpaths[name] = os.path.join(directory, f)
+        elif ext == STUB_SUFFIX and stubs and modpath is None:
+            modpaths[name] = os.path.join(directory, f)
+    return PackageEntry(subpkgs, submods, modpaths)
+
+
+def get_exclude_prefixes(private):
+    """Return the prefixes of directories that are never walked
+
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :returns: hidden ('.') and, if private is False, private ('_') prefixes
+    :rtype: :class:`tuple`
+    :raises: None
+    """
+    if private:
+        return ('.',)
+    return ('.', '_')
+
+
+def scan_dir(directory, excludes, private, followlinks, all_files=False):
+    """List the directory without excluded, hidden and private subdirectories
+
+    :param directory: the directory
+    :type directory: :class:`str`
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`ExcludeMatcher`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :param followlinks: descend into symbolic links
+    :type followlinks: :class:`bool`
+    :param all_files: list all files that are not excluded, not only python files
+    :type all_files: :class:`bool`
+    :returns: the subdirectories, the subdirectories to descend into and the files
+    :rtype: :class:`tuple` of :class:`list`
+    :raises: :class:`OSError` if the directory cannot be listed
+    """
+    exclude_prefixes = get_exclude_prefixes(private)
+    subs, descend, files = [], [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir():
+                if name.startswith(exclude_prefixes) or excludes.match(entry.path):
+                    continue
+                subs.append(name)
+                if followlinks or not entry.is_symlink():
+                    descend.append(name)
+            # document only Python module files (that aren't excluded)
+            elif all_files or os.path.splitext(name)[1] in PY_SUFFIXES:
+                if not excludes.match(entry.path):
+                    files.append(name)
+    return subs, descend, files
+
+
+def is_source(path):
+    """Return True if the path is a python source file or a stub
+
+    :param path: the path
+    :type path: :class:`str`
+    :returns: True for the suffixes in :data:`PY_SUFFIXES` and :data:`STUB_SUFFIX`
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    ext = os.path.splitext(path)[1]
+    return ext in PY_SUFFIXES or ext == STUB_SUFFIX
+
+
+def get_stamps(src, excludes, private, followlinks):
+    """Return the modification time and size of every python file and ``.pyi`` stub in the tree
+
     :param src: the path to the python source files
     :type src: :class:`str`
-    :param dest: the output directory
-    :type dest: :class:`str`
-    :param excludes: the paths to exclude
-    :type excludes: :class:`list`
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`ExcludeMatcher`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :param followlinks: follow symbolic links
+    :type followlinks: :class:`bool`
+    :returns: the stamps by path
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    stamps = {}
+    stack = [src]
+    while stack:
+        root = stack.pop()
+        try:
+            subs, descend, files = scan_dir(root, excludes, private, followlinks, True)
+        except OSError:
+            continue
+        for f in files:
+            if not is_source(f):
+                continue
+            path = os.path.join(root, f)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (st.st_mtime_ns, st.st_size)
+        stack.extend(os.path.join(root, sub) for sub in descend)
+    return stamps
+
+
+def iter_tree(app, src, excludes, followlinks, private, index=None):
+    """Look for every package and toplevel module in the directory tree.
+
+    Modules inside packages are not yielded. They are documented along with
+    their package, see :func:`create_package_file`.
+
+    Excluded, hidden and private directories are pruned before descending.
+    If an index is given, the :class:`PackageEntry` of each package is added
+    before the package is yielded.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: the path to the python source files
+    :type src: :class:`str`
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`ExcludeMatcher` | :class:`list`
     :param followlinks: follow symbolic links
     :type followlinks: :class:`bool`
-    :param force: overwrite existing files
-    :type force: :class:`bool`
-    :param dryrun: do not generate files
-    :type dryrun: :class:`bool`
     :param private: include "_private" modules
     :type private: :class:`bool`
-    :param suffix: the file extension
-    :type suffix: :class:`str`
+    :param index: the index to add the packages to
+    :type index: :class:`PackageIndex` | None
+    :returns: generator of tuples with the root package, the package or module name without root,
+              the path to the package directory or module file and whether it is a package
+    :rtype: generator
     """
+    if not isinstance(excludes, ExcludeMatcher):
+        excludes = ExcludeMatcher(excludes, src)
     # check if the base directory is a package and get its name
-    if INITPY in os.listdir(src):
+    if os.path.isfile(os.path.join(src, INITPY)):
         root_package = src.split(os.path.sep)[-1]
     else:
         # otherwise, the base is a directory with packages
         root_package = None
 
-    toplevels = []
-    for root, subs, files in walk(src, followlinks=followlinks):
-        # document only Python module files (that aren't excluded)
-        py_files = sorted(f for f in files
-                          if os.path.splitext(f)[1] in PY_SUFFIXES and  # noqa: W504
-                          not is_excluded(os.path.join(root, f), excludes))
+    stack = [src]
+    while stack:
+        root = stack.pop()
+        try:
+            subs, descend, files = scan_dir(root, excludes, private, followlinks, index is not None)
+        except OSError:
+            continue
+        py_files = sorted(f for f in files if os.path.splitext(f)[1] in PY_SUFFIXES)
         is_pkg = INITPY in py_files
         if is_pkg:
             py_files.remove(INITPY)
             py_files.insert(0, INITPY)
         elif root != src:
             # only accept non-package at toplevel
-            del subs[:]
             continue
-        # remove hidden ('.') and private ('_') directories, as well as
-        # excluded dirs
-        if private:
-            exclude_prefixes = ('.',)
-        else:
-            exclude_prefixes = ('.', '_')
-        subs[:] = sorted(sub for sub in subs if not sub.startswith(exclude_prefixes) and not
-                         is_excluded(os.path.join(root, sub), excludes))
+        # walk the subdirectories in sorted order, top-down
+        stack.extend(os.path.join(root, sub) for sub in sorted(descend, reverse=True))
         if is_pkg:
+            if index is not None:
+                index.add(root, make_package_entry(app, root, subs, files, private))
             # we are in a package with something to document
             if subs or len(py_files) > 1 or not \
                shall_skip(app, os.path.join(root, INITPY), private):
                 subpackage = root[len(src):].lstrip(os.path.sep).\
                     replace(os.path.sep, '.')
-                create_package_file(app, env, root_package, subpackage,
-                                    private, dest, suffix, dryrun, force)
-                toplevels.append(makename(root_package, subpackage))
+                yield root_package, subpackage, root, True
         else:
             # if we are at the root level, we don't require it to be a package
             assert root == src and root_package is None
             for py_file in py_files:
                 if not shall_skip(app, os.path.join(src, py_file), private):
                     module = os.path.splitext(py_file)[0]
-                    create_module_file(app, env, root_package, module, dest, suffix, dryrun, force)
-                    toplevels.append(module)
+                    yield root_package, module, os.path.join(src, py_file), False
+
+
+def recurse_tree(app, env, src, dest, excludes, followlinks, force, dryrun, private, suffix, report=None,
+                 cache=None, importer=None, evict=False, writer=None):
+    """Look for every file in the directory tree and create the corresponding
+    ReST files.
+
+    The tree is walked lazily and every file is written as soon as it is rendered.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the jinja environment
+    :type env: :class:`jinja2.Environment`
+    :param src: the path to the python source files
+    :type src: :class:`str`
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :param excludes: the paths to exclude
+    :type excludes: :class:`list`
+    :param followlinks: follow symbolic links
+    :type followlinks: :class:`bool`
+    :param force: overwrite existing files
+    :type force: :class:`bool`
+    :param dryrun: do not generate files
+    :type dryrun: :class:`bool`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :param report: the report to record the outcome of each file in
+    :type report: :class:`GenerationReport` | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param importer: the importer for isolation mode
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :param evict: remove the imported modules after each package, see :class:`ModuleEvictor`
+    :type evict: :class:`bool`
+    :param writer: the writer to queue the files in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :returns: the names of the toplevel packages and modules
+    :rtype: :class:`list`
+    """
+    toplevels = []
+    evictor = ModuleEvictor() if evict else None
+    index = PackageIndex()
+    items = timing.timed_iter(iter_tree(app, src, excludes, followlinks, private, index), 'walk')
+    for root_package, name, path, ispkg in items:
+        if ispkg:
+            create_package_file(app, env, root_package, name,
+                                private, dest, suffix, dryrun, force, report, cache, path, importer,
+                                index.get(path), writer)
+        else:
+            create_module_file(app, env, root_package, name, dest, suffix, dryrun, force, report,
+                               cache, path, importer, writer)
+        toplevels.append(makename(root_package, name))
+        if evictor is not None:
+            evictor.evict(toplevels[-1])
     return toplevels
 
 
@@ -500,6 +1916,110 @@ def normalize_excludes(excludes):
     return [os.path.normpath(os.path.abspath(exclude)) for exclude in excludes]
 
 
+def is_pattern(exclude):
+    """Return True if the exclude is a glob pattern instead of a path
+
+    :param exclude: the exclude
+    :type exclude: :class:`str`
+    :returns: True if it contains ``*``, ``?`` or ``[``
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    return any(c in exclude for c in '*?[')
+
+
+def translate_pattern(pattern):
+    """Translate a glob pattern to a regular expression
+
+    The pattern is matched against paths relative to the source directory,
+    with ``/`` as separator:
+
+      * ``*`` matches anything except ``/``, ``?`` matches one character
+        except ``/`` and ``[...]`` matches one of the characters.
+      * ``**/`` matches any number of directories, including none.
+      * A trailing ``/**`` matches the directory and everything in it.
+      * A pattern without ``/`` matches the name at any depth, e.g. ``*_pb2.py``.
+
+    :param pattern: the glob pattern
+    :type pattern: :class:`str`
+    :returns: the regular expression
+    :rtype: :class:`str`
+    :raises: None
+    """
+    pattern = pattern.replace(os.sep, '/').strip('/')
+    if '/' not in pattern:
+        pattern = '**/' + pattern
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            parts.append('(?:/.*)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            j = pattern.index(']', i + 2)
+            chars = pattern[i + 1:j]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[%s]' % chars.replace('\\', '\\\\'))
+            i = j + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+class ExcludeMatcher(object):
+    """Matches paths against the excludes of ``jinjaapi_exclude_paths``.
+
+    Excludes are either paths or glob patterns, see :func:`translate_pattern`.
+    All patterns are compiled once into a single regular expression.
+    """
+
+    def __init__(self, excludes, src):
+        """Initialize a new matcher
+
+        :param excludes: paths and glob patterns to exclude
+        :type excludes: :class:`list`
+        :param src: the source directory the patterns are relative to
+        :type src: :class:`str`
+        :raises: None
+        """
+        self.src = os.path.normpath(os.path.abspath(src))
+        self.paths = set(normalize_excludes(e for e in excludes if not is_pattern(e)))
+        patterns = [translate_pattern(e) for e in excludes if is_pattern(e)]
+        self.regex = re.compile('(?:%s)\\Z' % '|'.join(patterns)) if patterns else None
+
+    def match(self, path):
+        """Return True if the path is excluded
+
+        :param path: a path below the source directory
+        :type path: :class:`str`
+        :returns: True if the path is excluded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if path in self.paths:
+            return True
+        if self.regex is None:
+            return False
+        rel = path[len(self.src) + 1:] if path.startswith(self.src) else path
+        if os.sep != '/':
+            rel = rel.replace(os.sep, '/')
+        return self.regex.match(rel) is not None
+
+
 def is_excluded(root, excludes):
     """Check if the directory is in the exclude list.
 
@@ -515,7 +2035,8 @@ def is_excluded(root, excludes):
 
 def generate(app, src, dest, exclude=[], followlinks=False,
              force=False, dryrun=False, private=False, suffix='rst',
-             template_dirs=None):
+             template_dirs=None, cache=None, workers=1, template_cache_dir=None, precompile=False,
+             importer=None, evict=False, writers=0, inventory=False):
     """Generage the rst files
 
     Raises an :class:`OSError` if the source path is not a directory.
@@ -540,8 +2061,26 @@ def generate(app, src, dest, exclude=[], followlinks=False,
     :type suffix: :class:`str`
     :param template_dirs: directories to search for user templates
     :type template_dirs: None | :class:`list`
-    :returns: None
-    :rtype: None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param workers: the number of worker processes. If greater than 1, see :func:`jinjaapidoc.parallel.recurse_tree`.
+    :type workers: :class:`int`
+    :param template_cache_dir: directory to cache compiled templates in
+    :type template_cache_dir: None | :class:`str`
+    :param precompile: load the built-in templates from precompiled modules, see :func:`precompile_templates`
+    :type precompile: :class:`bool`
+    :param importer: the importer for isolation mode. With multiple workers, each worker creates its own.
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :param evict: remove modules imported for introspection after each package, see :class:`ModuleEvictor`.
+                  With multiple workers, the config value ``jinjaapi_evict_modules`` is used by each worker.
+    :type evict: :class:`bool`
+    :param writers: the number of threads that write the files in the background, 0 to write directly.
+                    See :class:`jinjaapidoc.writer.FileWriter`.
+    :type writers: :class:`int`
+    :param inventory: collect the records for the inventory in the report, see :func:`write_inventory`
+    :type inventory: :class:`bool`
+    :returns: the report with the outcome of every file
+    :rtype: :class:`GenerationReport`
     :raises: OSError
     """
     suffix = suffix.strip('.')
@@ -550,44 +2089,475 @@ def generate(app, src, dest, exclude=[], followlinks=False,
     if not os.path.isdir(dest) and not dryrun:
         os.makedirs(dest)
     src = os.path.normpath(os.path.abspath(src))
-    exclude = normalize_excludes(exclude)
-    loader = make_loader(template_dirs)
-    env = make_environment(loader)
-    recurse_tree(app, env, src, dest, exclude, followlinks, force, dryrun, private, suffix)
+    exclude = ExcludeMatcher(exclude, src)
+    env = create_environment(template_dirs, template_cache_dir, precompile)
+    report = GenerationReport(inventory)
+    writer = filewriter.FileWriter(app, writers, report=report) if writers else None
+    try:
+        if workers > 1:
+            parallel.recurse_tree(app, env, src, dest, exclude, followlinks, force, dryrun, private, suffix, report,
+                                  cache, workers, template_dirs, template_cache_dir, precompile, writer)
+        else:
+            recurse_tree(app, env, src, dest, exclude, followlinks, force, dryrun, private, suffix, report, cache,
+                         importer, evict, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info('jinjaapidoc: %s files.', report.summary())
+    return report
 
 
-def main(app):
-    """Parse the config of the app and initiate the generation process
+def write_inventory(fname, src, report):
+    """Write the inventory of the generated modules, see :mod:`jinjaapidoc.inventory`
+
+    :param fname: the path of the inventory file
+    :type fname: :class:`str`
+    :param src: path to python source files. The paths in the inventory are relative to it.
+    :type src: :class:`str`
+    :param report: the report with the records
+    :type report: :class:`GenerationReport`
+    :returns: None
+    :rtype: None
+    :raises: OSError
+    """
+    src = os.path.abspath(src)
+    records = {}
+    for name, record in report.records.items():
+        if record['path']:
+            record = dict(record, path=os.path.relpath(record['path'], src).replace(os.sep, '/'))
+        records[name] = record
+    apiinventory.write(fname, records)
+    logger.info('jinjaapidoc: wrote the inventory of %s modules to %s.', len(records), fname)
+
+
+def get_result_key(app, src, out, template_dirs):
+    """Return the key of a generation for :func:`reuse_result`
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: path to python source files
+    :type src: :class:`str`
+    :param out: output directory
+    :type out: :class:`str`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :returns: the key
+    :rtype: :class:`tuple`
+    :raises: None
+    """
+    names = [name for name in app.config.values if name.startswith('jinjaapi_')]
+    return (os.path.abspath(src), os.path.abspath(out), ctxcache.make_key(app.config, names), tuple(template_dirs))
+
+
+def get_fingerprint(app, src, template_dirs):
+    """Return a fingerprint of the python files and the templates
+
+    Only the modification times and sizes are compared, no file is read.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: path to python source files
+    :type src: :class:`str`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :returns: the fingerprint
+    :rtype: :class:`str`
+    :raises: None
+    """
+    c = app.config
+    src = os.path.normpath(os.path.abspath(src))
+    stamps = get_stamps(src, ExcludeMatcher(c.jinjaapi_exclude_paths, src), c.jinjaapi_includeprivate,
+                        c.jinjaapi_followlinks)
+    stamps.update(get_template_stamps(template_dirs))
+    return hashlib.sha1(repr(sorted(stamps.items())).encode('utf-8')).hexdigest()
+
+
+def get_template_stamps(template_dirs):
+    """Return the stamps of all files in the template directories
+
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :returns: the stamps by path
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    stamps = {}
+    for directory in template_dirs:
+        for root, dirs, files in os.walk(directory):
+            for f in files:
+                path = os.path.join(root, f)
+                stamps[path] = ctxcache.make_stamp(path)
+    return stamps
+
+
+def get_template_fingerprint(template_dirs):
+    """Return a fingerprint of the templates, stored in the context cache for :func:`plan`
+
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :returns: the fingerprint
+    :rtype: :class:`str`
+    :raises: None
+    """
+    stamps = get_template_stamps(template_dirs)
+    return hashlib.sha1(repr((template_dirs, sorted(stamps.items()))).encode('utf-8')).hexdigest()
+
+
+def get_output_stamps(report):
+    """Return the stamps of the files that were written or are up to date
+
+    :param report: the report of the generation
+    :type report: :class:`GenerationReport`
+    :returns: the stamps by path
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    return dict((fname, ctxcache.make_stamp(fname))
+                for status in (CREATED, UPDATED, UNCHANGED) for fname in report.files[status])
+
+
+def reuse_result(app, key, fingerprint):
+    """Return the report of a previous generation in this process with the same inputs
+
+    Several builders that run in one process, e.g. html and latex, generate the
+    same files. The files of the previous generation are registered in the
+    environment of the app again, if neither the sources, the templates nor the
+    generated files changed since. The files are reported as unchanged, so
+    sphinx does not read them again, see :func:`get_outdated`.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param key: the key from :func:`get_result_key`
+    :type key: :class:`tuple`
+    :param fingerprint: the fingerprint from :func:`get_fingerprint`
+    :type fingerprint: :class:`str`
+    :returns: a report with all files of the previous generation unchanged or None if the files have to be generated
+    :rtype: :class:`GenerationReport` | None
+    :raises: None
+    """
+    result = _results.get(key)
+    if result is None or result[0] != fingerprint:
+        return None
+    report, outputs = result[1:]
+    if get_output_stamps(report) != outputs:
+        return None
+    reused = GenerationReport()
+    reused.classpages = list(report.classpages)
+    reused.records = report.records
+    reused.failures = list(report.failures)
+    for status in (CREATED, UPDATED, UNCHANGED):
+        for fname in report.files[status]:
+            add_found_doc(app, fname)
+            reused.add(UNCHANGED, fname)
+    return reused
+
+
+def hide_classpages(app, report):
+    """Remove the files with generated class pages from the documents autosummary processes
 
     :param app: the sphinx app
     :type app: :class:`sphinx.application.Sphinx`
+    :param report: the report of the generation
+    :type report: :class:`GenerationReport`
     :returns: None
     :rtype: None
     :raises: None
     """
+    if not report.classpages:
+        return
+    # autosummary_generate only processes the documents it finds at this point
+    app.env.found_docs.difference_update(get_docname(app, fname) for fname in report.classpages)
+    logger.info('jinjaapidoc: generated the class pages of %s files.', len(report.classpages))
+
+
+def create_cache(app):
+    """Return the loaded context cache if ``jinjaapi_cache`` or ``jinjaapi_sync`` is set
+
+    :param app: the sphinx app or a stand-in with ``config`` and ``doctreedir``
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: the cache or None
+    :rtype: :class:`jinjaapidoc.cache.ContextCache` | None
+    :raises: None
+    """
+    c = app.config
+    if not (c.jinjaapi_cache or c.jinjaapi_sync):
+        return None
+    cache = ctxcache.ContextCache(os.path.join(app.doctreedir, ctxcache.CACHE_FILENAME), ctxcache.make_key(c))
+    cache.load()
+    return cache
+
+
+def start_timing(app):
+    """Start the timings if ``jinjaapi_timing`` is set or imports are profiled
+
+    Imports are profiled if ``jinjaapi_profile_imports`` or ``jinjaapi_profile_dir`` is set.
+    With ``jinjaapi_profile_dir``, the profiles of the ``jinjaapi_timing_top`` slowest imports are kept.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: the started timings or None
+    :rtype: :class:`jinjaapidoc.timing.Timings` | None
+    :raises: None
+    """
+    c = app.config
+    imports = c.jinjaapi_profile_imports or bool(c.jinjaapi_profile_dir)
+    if not (c.jinjaapi_timing or imports):
+        return None
+    return timing.start(imports, c.jinjaapi_timing_top if c.jinjaapi_profile_dir else 0)
+
+
+def update(app, src, out, template_dirs):
+    """Generate the rst files according to the config of the app
+
+    This prepares the output directory, sets up the context cache and the
+    isolated importer and deletes stale files in sync mode.
+
+    If the same files were generated before in this process and nothing
+    changed since, they are reused, see :func:`reuse_result`.
+    If ``jinjaapi_plan`` is True, nothing is generated, see :func:`plan`.
+
+    :param app: the sphinx app or a stand-in with ``config``, ``env`` and ``doctreedir``
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: path to python source files
+    :type src: :class:`str`
+    :param out: output directory
+    :type out: :class:`str`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :returns: the report with the outcome of every file
+    :rtype: :class:`GenerationReport`
+    :raises: OSError
+    """
+    c = app.config
+    suffix = "rst"
+
+    if c.jinjaapi_plan:
+        return plan(app, src, out, template_dirs, suffix)
+
+    key = get_result_key(app, src, out, template_dirs)
+    fingerprint = get_fingerprint(app, src, template_dirs)
+    report = reuse_result(app, key, fingerprint)
+    if report is not None:
+        logger.info('jinjaapidoc: reusing the %s files generated before.', report.count(UNCHANGED))
+        hide_classpages(app, report)
+        return report
+
+    cache = create_cache(app)
+
+    prepare_dir(app, out, not (c.jinjaapi_nodelete or c.jinjaapi_sync))
+    template_cache_dir = None
+    if c.jinjaapi_template_cache or c.jinjaapi_precompile_templates:
+        template_cache_dir = os.path.join(app.doctreedir, TEMPLATE_CACHE_DIR)
+
+    importer = isolate.create_importer(app)
+    timings = start_timing(app)
+    start = time.perf_counter()
+    try:
+        report = generate(app, src, out,
+                          exclude=c.jinjaapi_exclude_paths,
+                          force=c.jinjaapi_force,
+                          followlinks=c.jinjaapi_followlinks,
+                          dryrun=c.jinjaapi_dryrun,
+                          private=c.jinjaapi_includeprivate,
+                          suffix=suffix,
+                          template_dirs=template_dirs,
+                          cache=cache,
+                          workers=parallel.get_workers(app),
+                          template_cache_dir=template_cache_dir,
+                          precompile=c.jinjaapi_precompile_templates,
+                          importer=importer,
+                          evict=c.jinjaapi_evict_modules,
+                          writers=c.jinjaapi_writer_threads,
+                          inventory=bool(c.jinjaapi_inventory))
+    finally:
+        if importer is not None:
+            importer.close()
+        if timings is not None:
+            timing.stop()
+            timings.total = time.perf_counter() - start
+
+    if timings is not None:
+        logger.info(timings.summary(c.jinjaapi_timing_top))
+        if c.jinjaapi_timing_file:
+            timings.save(c.jinjaapi_timing_file, c.jinjaapi_timing_top)
+        if c.jinjaapi_profile_dir:
+            files = timings.save_profiles(c.jinjaapi_profile_dir)
+            logger.info('jinjaapidoc: wrote the profiles of the %s slowest imports to %s.', len(files),
+                        c.jinjaapi_profile_dir)
+
+    if importer is not None and (importer.timeouts or importer.failures):
+        logger.warning('jinjaapidoc: %s modules timed out, %s failed: %s', len(importer.timeouts),
+                       len(importer.failures), ', '.join(importer.timeouts + importer.failures))
+
+    if c.jinjaapi_sync and not c.jinjaapi_dryrun:
+        sync_dir(app, out, report)
+        logger.info('jinjaapidoc: %s stale files deleted.', report.count(DELETED))
+
+    if cache is not None and not c.jinjaapi_dryrun:
+        logger.info('jinjaapidoc context cache: %s hits, %s misses.', cache.hits, cache.misses)
+        cache.prune()
+        cache.templates = get_template_fingerprint(template_dirs)
+        cache.save()
+
+    if c.jinjaapi_inventory and not c.jinjaapi_dryrun:
+        write_inventory(os.path.join(out, c.jinjaapi_inventory), src, report)
+
+    hide_classpages(app, report)
+    _results[key] = (fingerprint, report, get_output_stamps(report))
+    return report
+
+
+def iter_pages(app, src, excludes, followlinks, private):
+    """Look for every package and module that gets a page, without importing them
+
+    Unlike :func:`iter_tree`, the modules inside packages are yielded as well.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: the normalized absolute path to the python source files
+    :type src: :class:`str`
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`ExcludeMatcher`
+    :param followlinks: follow symbolic links
+    :type followlinks: :class:`bool`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :returns: generator of tuples with the full name and the path to the module file or package directory
+    :rtype: generator
+    """
+    index = PackageIndex()
+    for root_package, name, path, ispkg in iter_tree(app, src, excludes, followlinks, private, index):
+        fullname = makename(root_package, name)
+        yield fullname, path
+        if ispkg:
+            entry = index.get(path)
+            for submod in entry.submods:
+                yield makename(fullname, submod), entry.modpaths.get(submod)
+
+
+def plan(app, src, out, template_dirs, suffix='rst'):
+    """Report which pages a generation would create, update, delete or leave unchanged
+
+    Only the directory tree is walked. No module is imported and no template is
+    rendered. A page is unchanged if its file exists, the context cache has an
+    up to date entry for its source and the modules it re-exports members from,
+    see :meth:`jinjaapidoc.cache.ContextCache.is_current`, and the templates did
+    not change since the cache was saved. Every other existing page is reported as updated, although
+    the generation might leave it as it is, so enable ``jinjaapi_cache`` or
+    ``jinjaapi_sync`` for a precise plan.
+
+    Files of removed modules are reported as deleted if they would be deleted,
+    i.e. in sync mode or if the output directory is deleted first.
+    Only the pages of modules and packages and the files of removed modules
+    are planned, not the class pages and member pages of modules that still exist.
+
+    :param app: the sphinx app or a stand-in with ``config`` and ``doctreedir``
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: path to python source files
+    :type src: :class:`str`
+    :param out: output directory
+    :type out: :class:`str`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :returns: the report with the planned outcome of every file
+    :rtype: :class:`GenerationReport`
+    :raises: OSError
+    """
+    c = app.config
+    if not os.path.isdir(src):
+        raise OSError("%s is not a directory" % src)
+    src = os.path.normpath(os.path.abspath(src))
+    excludes = ExcludeMatcher(c.jinjaapi_exclude_paths, src)
+    wipe = not (c.jinjaapi_nodelete or c.jinjaapi_sync)
+    cache = ctxcache.ContextCache(os.path.join(app.doctreedir, ctxcache.CACHE_FILENAME), ctxcache.make_key(c))
+    cache.load()
+    templates = cache.templates == get_template_fingerprint(template_dirs)
+    if not templates:
+        logger.info('jinjaapidoc: no context cache for the current config and templates, '
+                    'every existing page may change.')
+    report = GenerationReport()
+    names = set()
+    for fullname, path in iter_pages(app, src, excludes, c.jinjaapi_followlinks, c.jinjaapi_includeprivate):
+        names.add(fullname)
+        fname = os.path.join(out, '%s.%s' % (fullname, suffix))
+        if wipe or not os.path.isfile(fname):
+            status = CREATED
+        elif not c.jinjaapi_force:
+            status = SKIPPED
+        elif templates and path is not None and cache.is_current(path):
+            status = UNCHANGED
+        else:
+            status = UPDATED
+        report.add(status, fname)
+    if wipe and os.path.isdir(out):
+        existing = [os.path.relpath(os.path.join(root, f), out) for root, dirs, files in os.walk(out) for f in files]
+    elif c.jinjaapi_sync:
+        existing = read_manifest(out)
+    else:
+        existing = []
+    for relpath in sorted(existing):
+        parts = relpath.replace(os.sep, '/').split('/')
+        owner = parts[0] if len(parts) > 1 else os.path.splitext(parts[0])[0]
+        fname = os.path.join(out, relpath)
+        if owner not in names and relpath != MANIFEST_FILENAME and os.path.isfile(fname):
+            report.add(DELETED, fname)
+    logger.info('jinjaapidoc plan: %s files.', report.summary())
+    return report
+
+
+def get_outdated(app, added, changed, report):
+    """Return the generated documents that sphinx has to read but did not detect as outdated
+
+    Sphinx compares modification times, which can miss files that were
+    rewritten within the timestamp resolution of the filesystem or on
+    network filesystems with a clock skew. The report knows exactly which
+    files were created and updated.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param added: the documents sphinx found to be new
+    :type added: :class:`set`
+    :param changed: the documents sphinx found to be changed
+    :type changed: :class:`set`
+    :param report: the report of the generation
+    :type report: :class:`GenerationReport`
+    :returns: the additional document names to read
+    :rtype: :class:`list`
+    :raises: None
+    """
+    new, updated, deleted = report.changes(app)
+    logger.info('jinjaapidoc: %s added, %s changed, %s removed documents.', len(new), len(updated), len(deleted))
+    missed = sorted((new | updated) & app.env.found_docs - added - changed)
+    if missed:
+        logger.debug('jinjaapidoc: reading documents not detected as outdated: %s', missed)
+    return missed
+
+
+def main(app):
+    """Parse the config of the app and initiate the generation process
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: the report with the outcome of every file or None if ``jinjaapi_srcdir`` is not set
+    :rtype: :class:`GenerationReport` | None
+    :raises: None
+    """
     c = app.config
     src = c.jinjaapi_srcdir
 
     if not src:
         return
 
-    suffix = "rst"
-
     out = c.jinjaapi_outputdir or app.env.srcdir
 
+    # the default list of sphinx is shared by all apps, so it must not be changed in place
     if c.jinjaapi_addsummarytemplate:
-        tpath = pkg_resources.resource_filename(__package__, AUTOSUMMARYTEMPLATE_DIR)
-        c.templates_path.append(tpath)
-
-    tpath = pkg_resources.resource_filename(__package__, TEMPLATE_DIR)
-    c.templates_path.append(tpath)
-
-    prepare_dir(app, out, not c.jinjaapi_nodelete)
-    generate(app, src, out,
-             exclude=c.jinjaapi_exclude_paths,
-             force=c.jinjaapi_force,
-             followlinks=c.jinjaapi_followlinks,
-             dryrun=c.jinjaapi_dryrun,
-             private=c.jinjaapi_includeprivate,
-             suffix=suffix,
-             template_dirs=c.templates_path)
+        tpath = get_template_dir(AUTOSUMMARYTEMPLATE_DIR)
+        c.templates_path = list(c.templates_path) + [tpath]
+
+    tpath = get_template_dir(TEMPLATE_DIR)
+    c.templates_path = list(c.templates_path) + [tpath]
+
+    return update(app, src, out, c.templates_path)
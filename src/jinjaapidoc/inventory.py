@@ -0,0 +1,177 @@
+"""This module contains the API inventory written alongside the rst files.
+
+The inventory lists every generated module and package with its
+subpackages, submodules, classes, exceptions, functions and data, so other
+tools do not have to import the package again.
+
+The first line of the file is a JSON header with the byte offset and length
+of every record. Each following line is the JSON record of one module::
+
+  {"format": "jinjaapidoc-inventory", "version": 1, "modules": {"pkg": [0, 312], ...}}
+  {"name": "pkg", "ispkg": true, "classes": [...], ...}
+
+A single module is loaded by reading the header and seeking to its record.
+This module does not import sphinx, so it is cheap to use in other tools::
+
+  from jinjaapidoc import inventory
+  record = inventory.load('docs/api/inventory.jsonl', 'pkg.mod')
+"""
+import json
+import os
+
+FORMAT = 'jinjaapidoc-inventory'
+"""Value of ``format`` in the header."""
+VERSION = 1
+"""Version of the file format."""
+KEYS = ('package', 'module', 'subpkgs', 'submods', 'classes', 'allclasses', 'exceptions', 'allexceptions',
+        'functions', 'allfunctions', 'data', 'alldata')
+"""Context variables that are stored in the records."""
+
+
+def make_record(var, ispkg, path=None):
+    """Return the record of a module for the inventory
+
+    :param var: the context of the module, see :func:`jinjaapidoc.gendoc.get_context`
+    :type var: :class:`dict`
+    :param ispkg: True for packages
+    :type ispkg: :class:`bool`
+    :param path: the path of the module file or package directory
+    :type path: :class:`str` | None
+    :returns: the record
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    record = {'name': var['fullname'], 'ispkg': ispkg, 'path': path}
+    for key in KEYS:
+        record[key] = var.get(key)
+    classmembers = var.get('classmembers')
+    if classmembers:
+        record['classmembers'] = dict((name, {'methods': m['all_methods'], 'attributes': m['all_attributes']})
+                                      for name, m in classmembers.items())
+    return record
+
+
+def write(fname, records):
+    """Write the inventory file
+
+    :param fname: the path of the file
+    :type fname: :class:`str`
+    :param records: the records by module name
+    :type records: :class:`dict`
+    :returns: None
+    :rtype: None
+    :raises: :class:`OSError` if the file cannot be written
+    """
+    index = {}
+    lines = []
+    offset = 0
+    for name in sorted(records):
+        line = json.dumps(records[name], sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n'
+        index[name] = [offset, len(line)]
+        offset += len(line)
+        lines.append(line)
+    header = {'format': FORMAT, 'version': VERSION, 'modules': index}
+    tmp = '%s.%s.tmp' % (fname, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(header, sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n')
+        f.writelines(lines)
+    os.replace(tmp, fname)
+
+
+class Inventory(object):
+    """Reads single records of an inventory file on demand."""
+
+    def __init__(self, fname):
+        """Open the inventory and read the header
+
+        :param fname: the path of the file
+        :type fname: :class:`str`
+        :raises: :class:`OSError` if the file cannot be read, :class:`ValueError` if it is no inventory
+        """
+        self.file = open(fname, 'rb')
+        try:
+            header = json.loads(self.file.readline().decode('utf-8'))
+            if header.get('format') != FORMAT or header.get('version') != VERSION:
+                raise ValueError('%s is no jinjaapidoc inventory of version %s' % (fname, VERSION))
+        except Exception:
+            self.file.close()
+            raise
+        self.index = header['modules']
+        self.start = self.file.tell()
+
+    def __enter__(self):
+        """Return the inventory
+
+        :returns: self
+        :rtype: :class:`Inventory`
+        :raises: None
+        """
+        return self
+
+    def __exit__(self, *exc):
+        """Close the file
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.close()
+
+    def __contains__(self, name):
+        """Return True if the module is in the inventory
+
+        :param name: the full name of the module
+        :type name: :class:`str`
+        :returns: True if there is a record
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return name in self.index
+
+    def names(self):
+        """Return the names of all modules and packages
+
+        :returns: the sorted names
+        :rtype: :class:`list`
+        :raises: None
+        """
+        return sorted(self.index)
+
+    def get(self, name):
+        """Return the record of the given module
+
+        :param name: the full name of the module
+        :type name: :class:`str`
+        :returns: the record or None if the module is not in the inventory
+        :rtype: :class:`dict` | None
+        :raises: None
+        """
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        self.file.seek(self.start + entry[0])
+        return json.loads(self.file.read(entry[1]).decode('utf-8'))
+
+    def close(self):
+        """Close the file
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.file.close()
+
+
+def load(fname, name):
+    """Return the record of a single module from the inventory file
+
+    :param fname: the path of the file
+    :type fname: :class:`str`
+    :param name: the full name of the module
+    :type name: :class:`str`
+    :returns: the record or None if the module is not in the inventory
+    :rtype: :class:`dict` | None
+    :raises: :class:`OSError` if the file cannot be read, :class:`ValueError` if it is no inventory
+    """
+    with Inventory(fname) as inv:
+        return inv.get(name)
@@ -0,0 +1,243 @@
+"""This module contains the isolated creation of template contexts.
+
+Creating the context of a module imports it. A module that hangs or takes
+very long at import time stalls the whole build and its memory is never
+freed. In isolation mode the import and the introspection happen in a
+reusable worker process instead. If a module does not finish within the
+timeout, the worker is killed and restarted and the module is rendered
+with an empty context, like a module that fails to import.
+"""
+import multiprocessing
+import os
+import signal
+import sys
+
+from sphinx.util import logging
+
+from jinjaapidoc import gendoc
+from jinjaapidoc import parallel
+from jinjaapidoc import timing
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+READY = 'ready'
+"""Message of a worker after it started."""
+
+
+def kill_process(process):
+    """Kill the process if it is still running
+
+    :meth:`multiprocessing.Process.kill` is new in python 3.7. On older versions
+    the process is killed with ``SIGKILL`` or terminated where there is no
+    such signal.
+
+    :param process: the process
+    :type process: :class:`multiprocessing.Process`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    if process.exitcode is not None:
+        return
+    if hasattr(process, 'kill'):
+        process.kill()
+    elif hasattr(signal, 'SIGKILL'):
+        os.kill(process.pid, signal.SIGKILL)
+    else:
+        process.terminate()
+
+
+def set_memory_limit(megabytes):
+    """Limit the address space of the current process
+
+    :param megabytes: the limit in megabytes
+    :type megabytes: :class:`int`
+    :returns: True if the limit could be set
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    if resource is None:
+        return False
+    limit = megabytes * 1024 * 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    return True
+
+
+def serve(conn, path, config_values, memory_limit=0):
+    """Create contexts for the requests received on the connection until it is closed
+
+    Each request is a tuple of package, module, fullname, path and index entry as for
+    :func:`jinjaapidoc.gendoc.get_context`. Each response is a tuple of the
+    context, whether the module could be imported, an error message or None
+    and the timings of the profiled imports or None.
+
+    :param conn: the connection to the main process
+    :type conn: :class:`multiprocessing.connection.Connection`
+    :param path: the :data:`sys.path` of the main process
+    :type path: :class:`list`
+    :param config_values: the jinjaapi config values
+    :type config_values: :class:`dict`
+    :param memory_limit: the memory ceiling in megabytes or 0 for no limit
+    :type memory_limit: :class:`int`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    sys.path[:] = path
+    if memory_limit and not set_memory_limit(memory_limit):
+        logger.warning('jinjaapidoc: cannot limit the memory of import workers on this platform.')
+    app = parallel.WorkerApp(parallel.WorkerConfig(config_values))
+    evictor = gendoc.ModuleEvictor() if app.config.jinjaapi_evict_modules else None
+    profile = app.config.jinjaapi_profile_imports or app.config.jinjaapi_profile_dir
+    conn.send(READY)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        package, module, fullname, modpath, entry = request
+        timings = gendoc.start_timing(app) if profile else None
+        try:
+            var = gendoc.get_context(app, package, module, fullname, modpath, entry)
+            response = (var, gendoc.is_cacheable(app, fullname, modpath), None)
+        except (Exception, SystemExit) as e:
+            response = (None, False, '%s: %s' % (type(e).__name__, e))
+        finally:
+            timing.stop()
+        conn.send(response + (timings,))
+        if evictor is not None:
+            evictor.evict(fullname)
+
+
+class IsolatedImporter(object):
+    """Creates template contexts in a worker process with a timeout."""
+
+    def __init__(self, app, timeout=0, memory_limit=0):
+        """Initialize a new importer. The worker is started on first use.
+
+        :param app: the sphinx app
+        :type app: :class:`sphinx.application.Sphinx`
+        :param timeout: seconds per module or 0 for no timeout
+        :type timeout: :class:`int` | :class:`float`
+        :param memory_limit: the memory ceiling of the worker in megabytes or 0 for no limit
+        :type memory_limit: :class:`int`
+        :raises: None
+        """
+        self.config_values = parallel.get_config_values(app.config)
+        self.timeout = timeout or None
+        self.memory_limit = memory_limit
+        self.process = None
+        self.conn = None
+        self.timeouts = []
+        self.failures = []
+
+    def start(self):
+        """Start the worker and wait until it is ready
+
+        :returns: None
+        :rtype: None
+        :raises: :class:`EOFError` if the worker exits during startup
+        """
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=serve, args=(child, list(sys.path), self.config_values, self.memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.conn.recv()
+
+    def kill(self):
+        """Kill the worker. A new one is started on the next request.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self.process is None:
+            return
+        kill_process(self.process)
+        self.process.join()
+        self.conn.close()
+        self.process = self.conn = None
+
+    def close(self):
+        """Stop the worker
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self.process is None:
+            return
+        self.conn.send(None)
+        self.process.join(5)
+        self.kill()
+
+    def get_context(self, package, module, fullname, path=None, entry=None):
+        """Return the context created by the worker
+
+        If the worker times out or fails, it is restarted and an empty
+        context is returned, see :func:`jinjaapidoc.gendoc.get_empty_context`.
+
+        :param package: the parent package name
+        :type package: str
+        :param module: the module name
+        :type module: str
+        :param fullname: package.module
+        :type fullname: str
+        :param path: the path to the module file or package directory
+        :type path: str | None
+        :param entry: the index entry of the package
+        :type entry: :class:`jinjaapidoc.gendoc.PackageEntry` | None
+        :returns: the context and whether it can be cached
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        if self.process is None:
+            self.start()
+        error = None
+        with timing.phase('import', fullname):
+            self.conn.send((package, module, fullname, path, entry))
+            if self.conn.poll(self.timeout):
+                try:
+                    var, imported, error, timings = self.conn.recv()
+                    if timings is not None and timing.active() is not None:
+                        timing.active().merge_imports(timings)
+                except EOFError:
+                    var, error = None, 'worker exited with code %s' % self.process.exitcode
+            else:
+                var = None
+                self.timeouts.append(fullname)
+                logger.warning('jinjaapidoc: import of %r timed out after %ss.', fullname, self.timeout)
+        if var is not None:
+            return var, imported
+        if error is not None:
+            self.failures.append(fullname)
+            logger.warning('jinjaapidoc: failed to create the context of %r: %s', fullname, error)
+        self.kill()
+        return gendoc.get_empty_context(package, module, fullname), False
+
+
+def create_importer(app):
+    """Return an :class:`IsolatedImporter` if ``jinjaapi_isolate`` is set
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: the importer or None
+    :rtype: :class:`IsolatedImporter` | None
+    :raises: None
+    """
+    c = app.config
+    if not c.jinjaapi_isolate:
+        return None
+    return IsolatedImporter(app, c.jinjaapi_import_timeout, c.jinjaapi_import_memory_limit)
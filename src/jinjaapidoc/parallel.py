@@ -0,0 +1,337 @@
+"""This module contains the parallel generation of the rst files.
+
+Importing and introspecting modules is independent for every module, so the
+context creation and template rendering is done in a pool of worker
+processes. Writing the files and registering them in the sphinx environment
+happens in the main process.
+"""
+import concurrent.futures
+import sys
+
+from sphinx.util import logging
+
+from jinjaapidoc import gendoc
+from jinjaapidoc import isolate
+from jinjaapidoc import timing
+
+logger = logging.getLogger(__name__)
+
+_worker = {}
+"""The app, jinja environment, isolated importer and module evictor of the current worker process."""
+
+
+class WorkerConfig(object):
+    """Picklable stand-in for the :class:`sphinx.config.Config` in workers."""
+
+    def __init__(self, values):
+        """Initialize the config with the given values
+
+        :param values: config names and values
+        :type values: :class:`dict`
+        :raises: None
+        """
+        self.values = values
+        self.__dict__.update(values)
+
+
+class WorkerApp(object):
+    """Picklable stand-in for the :class:`sphinx.application.Sphinx` in workers.
+
+    Only the config is available. There is no sphinx environment.
+    """
+
+    def __init__(self, config):
+        """Initialize the app with the given config
+
+        :param config: the config
+        :type config: :class:`WorkerConfig`
+        :raises: None
+        """
+        self.config = config
+
+
+def get_config_values(config):
+    """Return a dict with all jinjaapi config values of the given config
+
+    :param config: the sphinx config
+    :type config: :class:`sphinx.config.Config`
+    :returns: the config values
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    return dict((name, getattr(config, name)) for name in config.values if name.startswith('jinjaapi_'))
+
+
+def get_workers(app):
+    """Return the number of worker processes to use
+
+    Parallel rendering is opt-in with ``jinjaapi_workers``. The number of
+    processes of sphinx (``-j``) is not used.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :returns: the number of workers
+    :rtype: :class:`int`
+    :raises: None
+    """
+    return app.config.jinjaapi_workers or 1
+
+
+def init_worker(path, config_values, template_dirs, template_cache_dir=None, precompile=False):
+    """Initialize a worker process
+
+    This is done lazily on the first task, see :func:`render`, because the
+    ``initializer`` of :class:`concurrent.futures.ProcessPoolExecutor`
+    requires python 3.7.
+
+    :param path: the :data:`sys.path` of the main process
+    :type path: :class:`list`
+    :param config_values: the jinjaapi config values
+    :type config_values: :class:`dict`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :param template_cache_dir: directory to cache compiled templates in
+    :type template_cache_dir: None | :class:`str`
+    :param precompile: load the built-in templates from precompiled modules
+    :type precompile: :class:`bool`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    sys.path[:] = path
+    _worker['app'] = WorkerApp(WorkerConfig(config_values))
+    _worker['env'] = gendoc.create_environment(template_dirs, template_cache_dir, precompile)
+    _worker['importer'] = isolate.create_importer(_worker['app'])
+    _worker['evictor'] = gendoc.ModuleEvictor() if config_values['jinjaapi_evict_modules'] else None
+
+
+def render(initargs, package, module, path, ispkg, entry=None):
+    """Create the context and render the template in a worker process
+
+    :param initargs: the arguments for :func:`init_worker` if the worker is not initialized yet
+    :type initargs: :class:`tuple`
+    :param package: the parent package name
+    :type package: str
+    :param module: the module name
+    :type module: str
+    :param path: the path to the module file or package directory
+    :type path: str | None
+    :param ispkg: True for packages
+    :type ispkg: :class:`bool`
+    :param entry: the index entry of the package
+    :type entry: :class:`jinjaapidoc.gendoc.PackageEntry` | None
+    :returns: the context, the rendered text, whether the context can be cached and the timings or None
+    :rtype: :class:`tuple`
+    :raises: None
+    """
+    if not _worker:
+        init_worker(*initargs)
+    app = _worker['app']
+    timings = gendoc.start_timing(app)
+    try:
+        fullname = gendoc.makename(package, module)
+        if _worker['importer'] is not None:
+            var, cacheable = _worker['importer'].get_context(package, module, fullname, path, entry)
+        else:
+            var = gendoc.get_context(app, package, module, fullname, path, entry)
+            cacheable = gendoc.is_cacheable(app, fullname, path)
+        text = gendoc.render_context(_worker['env'], var, ispkg)
+        if _worker['evictor'] is not None:
+            _worker['evictor'].evict(fullname)
+    finally:
+        timing.stop()
+    return var, text, cacheable, timings
+
+
+class ParallelGenerator(object):
+    """Distributes the rendering of packages and modules to a process pool."""
+
+    def __init__(self, app, env, executor, initargs, dest, suffix, dryrun, force, private, report=None, cache=None,
+                 index=None, writer=None):
+        """Initialize a new generator
+
+        :param app: the sphinx app
+        :type app: :class:`sphinx.application.Sphinx`
+        :param env: the jinja environment, used for contexts from the cache
+        :type env: :class:`jinja2.Environment`
+        :param executor: the executor
+        :type executor: :class:`concurrent.futures.Executor`
+        :param initargs: the arguments for :func:`init_worker`, sent with every task
+        :type initargs: :class:`tuple`
+        :param dest: the output directory
+        :type dest: :class:`str`
+        :param suffix: the file extension
+        :type suffix: :class:`str`
+        :param dryrun: do not generate files
+        :type dryrun: :class:`bool`
+        :param force: overwrite existing files
+        :type force: :class:`bool`
+        :param private: include "_private" modules
+        :type private: :class:`bool`
+        :param report: the report to record the outcome of each file in
+        :type report: :class:`jinjaapidoc.gendoc.GenerationReport` | None
+        :param cache: the context cache
+        :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+        :param index: the package index filled by the walk
+        :type index: :class:`jinjaapidoc.gendoc.PackageIndex` | None
+        :param writer: the writer to queue the files in
+        :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+        :raises: None
+        """
+        self.app = app
+        self.env = env
+        self.executor = executor
+        self.initargs = initargs
+        self.dest = dest
+        self.suffix = suffix
+        self.dryrun = dryrun
+        self.force = force
+        self.private = private
+        self.report = report
+        self.cache = cache
+        self.index = index
+        self.writer = writer
+        self.pending = {}
+
+    def submit(self, package, module, path, ispkg):
+        """Render the package or module in a worker or directly if it is cached
+
+        :param package: the parent package name
+        :type package: str
+        :param module: the module name
+        :type module: str
+        :param path: the path to the module file or package directory
+        :type path: str | None
+        :param ispkg: True for packages
+        :type ispkg: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        entry = self.index.get(path) if self.index is not None and ispkg else None
+        var = self.cache.get(path) if self.cache is not None and path else None
+        if var is not None:
+            if entry is not None:
+                var['subpkgs'], var['submods'] = list(entry.subpkgs), list(entry.submods)
+            self.finish(package, module, path, ispkg, var, gendoc.render_context(self.env, var, ispkg), False)
+            return
+        future = self.executor.submit(render, self.initargs, package, module, path, ispkg, entry)
+        self.pending[future] = (package, module, path, ispkg)
+
+    def finish(self, package, module, path, ispkg, var, text, cacheable):
+        """Write the rendered file and submit the modules of packages
+
+        :param package: the parent package name
+        :type package: str
+        :param module: the module name
+        :type module: str
+        :param path: the path to the module file or package directory
+        :type path: str | None
+        :param ispkg: True for packages
+        :type ispkg: :class:`bool`
+        :param var: the context
+        :type var: :class:`dict`
+        :param text: the rendered text
+        :type text: :class:`str`
+        :param cacheable: store the context in the cache
+        :type cacheable: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        fullname = gendoc.makename(package, module)
+        if cacheable and self.cache is not None and path:
+            self.cache.set(path, var)
+        if self.report is not None:
+            self.report.add_context(var, ispkg, path)
+        if ispkg:
+            entry = self.index.get(path) if self.index is not None else None
+            for submod in var['submods']:
+                if gendoc.shall_skip(self.app, submod, self.private):
+                    continue
+                if entry is not None:
+                    modpath = entry.modpaths.get(submod)
+                else:
+                    modpath = gendoc.find_module_path(path, submod) if path else None
+                self.submit(fullname, submod, modpath, False)
+        gendoc.write_file(self.app, fullname, text, self.dest, self.suffix, self.dryrun, self.force, self.report,
+                          self.writer)
+        gendoc.create_page_files(self.app, self.env, var, self.dest, self.suffix, self.dryrun, self.force,
+                                 self.report, self.writer)
+        gendoc.create_class_files(self.app, self.env, var, text, self.dest, self.suffix, self.dryrun, self.force,
+                                  self.report, self.writer)
+
+    def wait(self):
+        """Wait for all pending work including the modules of packages
+
+        :returns: None
+        :rtype: None
+        :raises: Any exception raised in a worker
+        """
+        while self.pending:
+            done, _ = concurrent.futures.wait(self.pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                package, module, path, ispkg = self.pending.pop(future)
+                var, text, cacheable, timings = future.result()
+                if timings is not None and timing.active() is not None:
+                    timing.active().merge(timings)
+                self.finish(package, module, path, ispkg, var, text, cacheable)
+
+
+def recurse_tree(app, env, src, dest, excludes, followlinks, force, dryrun, private, suffix, report=None,
+                 cache=None, workers=2, template_dirs=None, template_cache_dir=None, precompile=False, writer=None):
+    """Like :func:`jinjaapidoc.gendoc.recurse_tree` but render in worker processes
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the jinja environment
+    :type env: :class:`jinja2.Environment`
+    :param src: the path to the python source files
+    :type src: :class:`str`
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :param excludes: the paths to exclude
+    :type excludes: :class:`list`
+    :param followlinks: follow symbolic links
+    :type followlinks: :class:`bool`
+    :param force: overwrite existing files
+    :type force: :class:`bool`
+    :param dryrun: do not generate files
+    :type dryrun: :class:`bool`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :param report: the report to record the outcome of each file in
+    :type report: :class:`jinjaapidoc.gendoc.GenerationReport` | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param workers: the number of worker processes
+    :type workers: :class:`int`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: None | :class:`list`
+    :param template_cache_dir: directory to cache compiled templates in
+    :type template_cache_dir: None | :class:`str`
+    :param precompile: load the built-in templates from precompiled modules
+    :type precompile: :class:`bool`
+    :param writer: the writer to queue the files in
+    :type writer: :class:`jinjaapidoc.writer.FileWriter` | None
+    :returns: the names of the toplevel packages and modules
+    :rtype: :class:`list`
+    """
+    logger.info('Generating jinjaapidoc files with %s workers.', workers)
+    # compile the templates once, so the workers find them in the cache
+    env.get_template(gendoc.PACKAGE_TEMPLATE_NAME)
+    env.get_template(gendoc.MODULE_TEMPLATE_NAME)
+    initargs = (list(sys.path), get_config_values(app.config), template_dirs, template_cache_dir, precompile)
+    toplevels = []
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        index = gendoc.PackageIndex()
+        generator = ParallelGenerator(app, env, executor, initargs, dest, suffix, dryrun, force, private, report,
+                                      cache, index, writer)
+        items = timing.timed_iter(gendoc.iter_tree(app, src, excludes, followlinks, private, index), 'walk')
+        for root_package, name, path, ispkg in items:
+            generator.submit(root_package, name, path, ispkg)
+            toplevels.append(gendoc.makename(root_package, name))
+        generator.wait()
+    return toplevels
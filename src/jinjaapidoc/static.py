@@ -0,0 +1,322 @@
+"""This module contains the static analysis of python source files.
+
+Instead of importing a module, its source is parsed with :mod:`ast` and the
+names bound at module level are classified. This avoids the cost and the side
+effects of importing the module and all its dependencies.
+
+Stub files (``.pyi``) are parsed the same way. Cython sources (``.pyx``) are
+read statement by statement: only the declarations that are visible from
+python are classified, so extensions do not have to be compiled.
+"""
+import ast
+import builtins
+import re
+
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+MODULE_ATTRIBUTES = ('__builtins__', '__cached__', '__doc__', '__file__',
+                     '__loader__', '__name__', '__package__', '__spec__')
+"""Attributes every imported module has."""
+EXCEPTION_SUFFIXES = ('Error', 'Exception', 'Warning', 'Exit', 'Interrupt')
+"""Base class names with these suffixes are considered exceptions if the base cannot be resolved."""
+CYTHON_SKIP = ('cdef ', 'ctypedef ', 'cimport ', 'include ', 'DEF ', 'IF ', 'ELIF ', 'ELSE:')
+"""Prefixes of cython statements that bind nothing visible from python."""
+CYTHON_CLASS_RE = re.compile(r'^cdef\s+(?:(?:public|api|extern|final|readonly)\s+)*class\s+(\w+)\s*(\([^)]*\))?')
+"""Matches extension types and captures the name and the bases."""
+CYTHON_FUNCTION_RE = re.compile(r'^(?:cpdef|(?:async\s+)?def)\s+(?!enum\b|class\b)(?:[^(=]*?[\s*&])?(\w+)\s*\(')
+"""Matches ``def`` and ``cpdef`` functions and captures the name."""
+
+
+class ModuleInfo(object):
+    """The names bound at module level of a parsed module."""
+
+    def __init__(self):
+        """Initialize empty sets for all kinds of names
+
+        :raises: None
+        """
+        self.classes = set()
+        self.exceptions = set()
+        self.functions = set()
+        self.data = set()
+        self.modules = set()
+        self.imported = set()
+        self.unresolved = set()
+        self.all = None
+
+    def names(self):
+        """Return all names bound in the module
+
+        :returns: all names
+        :rtype: :class:`set`
+        :raises: None
+        """
+        return (self.classes | self.exceptions | self.functions |
+                self.data | self.modules | self.imported)
+
+    def bind(self, name, kind, resolved=True):
+        """Bind the name to the given kind, replacing previous bindings
+
+        The name is marked as unresolved if its kind cannot be determined
+        statically: imported names, aliases, results of calls, decorated
+        definitions and names that are bound to different kinds, e.g. in the
+        branches of a ``try`` statement.
+
+        :param name: the name
+        :type name: :class:`str`
+        :param kind: ``'classes'``, ``'exceptions'``, ``'functions'``, ``'data'``, ``'modules'`` or ``'imported'``
+        :type kind: :class:`str`
+        :param resolved: False if the kind is only a guess
+        :type resolved: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        for k in ('classes', 'exceptions', 'functions', 'data', 'modules', 'imported'):
+            names = getattr(self, k)
+            if name in names and k != kind:
+                self.unresolved.add(name)
+            names.discard(name)
+        getattr(self, kind).add(name)
+        if not resolved or kind == 'imported':
+            self.unresolved.add(name)
+
+
+def is_exception_base(info, node):
+    """Return True if the base class expression refers to an exception
+
+    Local classes and builtins are resolved. Other bases are guessed by
+    their name, see :data:`EXCEPTION_SUFFIXES`.
+
+    :param info: the module info with the classes parsed so far
+    :type info: :class:`ModuleInfo`
+    :param node: the base class expression
+    :type node: :class:`ast.expr`
+    :returns: True if the base is an exception
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in info.exceptions:
+            return True
+        if name in info.classes:
+            return False
+        builtin = getattr(builtins, name, None)
+        if isinstance(builtin, type):
+            return issubclass(builtin, BaseException)
+    elif isinstance(node, ast.Attribute):
+        name = node.attr
+    else:
+        return False
+    return name.endswith(EXCEPTION_SUFFIXES)
+
+
+def literal_names(node):
+    """Return the strings of a literal list or tuple or None if it is not a literal
+
+    :param node: the expression
+    :type node: :class:`ast.expr`
+    :returns: the list of strings or None
+    :rtype: :class:`list` | None
+    :raises: None
+    """
+    try:
+        value = ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return None
+    if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) for v in value):
+        return None
+    return list(value)
+
+
+def target_names(node):
+    """Return the names bound by an assignment target
+
+    :param node: the target expression
+    :type node: :class:`ast.expr`
+    :returns: the names
+    :rtype: :class:`list`
+    :raises: None
+    """
+    if isinstance(node, ast.Name):
+        return [node.id]
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return [n for elt in node.elts for n in target_names(elt)]
+    if isinstance(node, ast.Starred):
+        return target_names(node.value)
+    return []
+
+
+def visit(info, statements):
+    """Classify the names bound by the given module level statements
+
+    The bodies of ``if``, ``try``, ``for``, ``while`` and ``with`` statements are
+    visited as well, so conditional definitions are picked up. Names whose kind
+    depends on the branch taken are marked as unresolved, see :meth:`ModuleInfo.bind`.
+
+    :param info: the module info to update
+    :type info: :class:`ModuleInfo`
+    :param statements: the statements
+    :type statements: :class:`list`
+    :returns: False if the names cannot be determined statically, e.g. for star imports
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    for node in statements:
+        if isinstance(node, ast.ClassDef):
+            exc = any(is_exception_base(info, b) for b in node.bases)
+            # a decorator may return anything
+            info.bind(node.name, 'exceptions' if exc else 'classes', not node.decorator_list)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            info.bind(node.name, 'functions', not node.decorator_list)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                info.bind(alias.asname or alias.name.split('.')[0], 'modules')
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                # the names or the __all__ of another module
+                if alias.name in ('*', '__all__'):
+                    return False
+                info.bind(alias.asname or alias.name, 'imported')
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [n for t in targets for n in target_names(t)]
+            if '__all__' in names:
+                if node.value is None:
+                    continue
+                value = literal_names(node.value)
+                if value is None:
+                    return False
+                if isinstance(node, ast.AugAssign):
+                    info.all = (info.all or []) + value
+                else:
+                    info.all = value
+            kind = 'functions' if isinstance(node.value, ast.Lambda) else 'data'
+            # aliases like ``text_type = str`` and calls may refer to a class or function
+            resolved = not isinstance(node.value, (ast.Name, ast.Attribute, ast.Call))
+            for name in names:
+                info.bind(name, kind, resolved)
+        else:
+            if isinstance(node, (ast.For, ast.AsyncFor)):
+                for name in target_names(node.target):
+                    info.bind(name, 'data', False)
+            for item in getattr(node, 'items', []):
+                for name in target_names(item.optional_vars) if item.optional_vars else []:
+                    info.bind(name, 'data', False)
+            for field in ('body', 'orelse', 'finalbody'):
+                if not visit(info, getattr(node, field, [])):
+                    return False
+            for handler in getattr(node, 'handlers', []):
+                if not visit(info, handler.body):
+                    return False
+    return True
+
+
+def iter_statements(source):
+    """Yield the module level statements of a cython source
+
+    Statements that span several lines are joined. The indented bodies of
+    compound statements and the module docstring are skipped.
+
+    :param source: the source
+    :type source: :class:`str`
+    :returns: generator of statements
+    :rtype: generator
+    :raises: None
+    """
+    statement = []
+    depth = 0
+    quote = None
+    for line in source.splitlines():
+        if quote is None and not statement and (not line.strip() or line[0] in ' \t#'):
+            continue
+        statement.append(line)
+        # count the brackets outside of strings and comments
+        i = 0
+        while i < len(line):
+            if quote is not None:
+                if line.startswith(quote, i):
+                    i += len(quote) - 1
+                    quote = None
+                elif line[i] == '\\':
+                    i += 1
+            elif line[i] == '#':
+                break
+            elif line[i] in '\'"':
+                quote = line[i] * 3 if line.startswith(line[i] * 3, i) else line[i]
+                i += len(quote) - 1
+            elif line[i] in '([{':
+                depth += 1
+            elif line[i] in ')]}':
+                depth -= 1
+            i += 1
+        if quote is not None and len(quote) == 1:
+            quote = None
+        if quote is None and depth <= 0 and not line.endswith('\\'):
+            yield '\n'.join(statement)
+            statement = []
+            depth = 0
+
+
+def visit_cython(info, source):
+    """Classify the names bound by the module level statements of a cython source
+
+    ``def`` and ``cpdef`` functions, classes, extension types, imports and
+    assignments are classified. ``cdef`` functions and variables are not visible
+    from python and skipped.
+
+    :param info: the module info to update
+    :type info: :class:`ModuleInfo`
+    :param source: the source
+    :type source: :class:`str`
+    :returns: False if the names cannot be determined statically, e.g. for star imports
+    :rtype: :class:`bool`
+    :raises: None
+    """
+    for statement in iter_statements(source):
+        m = CYTHON_CLASS_RE.match(statement)
+        if m:
+            statement = 'class %s%s:' % (m.group(1), m.group(2) or '')
+        elif statement.startswith(CYTHON_SKIP) or ' cimport ' in statement:
+            continue
+        if statement.rstrip().endswith(':'):
+            statement += '\n    pass'
+        try:
+            tree = ast.parse(statement)
+        except SyntaxError:
+            m = CYTHON_FUNCTION_RE.match(statement)
+            if m:
+                info.bind(m.group(1), 'functions')
+            continue
+        if not visit(info, tree.body):
+            return False
+    return True
+
+
+def parse(path):
+    """Parse the given source, stub or cython file and return the bound names
+
+    :param path: the path to the python source file
+    :type path: :class:`str`
+    :returns: the module info or None if the file cannot be analysed statically
+    :rtype: :class:`ModuleInfo` | None
+    :raises: None
+    """
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        if path.endswith('.pyx'):
+            source = source.decode('utf-8')
+        else:
+            tree = ast.parse(source, filename=path)
+    except (IOError, OSError, SyntaxError, ValueError) as e:
+        logger.debug('Cannot parse %s: %s', path, e)
+        return None
+    info = ModuleInfo()
+    if not (visit_cython(info, source) if path.endswith('.pyx') else visit(info, tree.body)):
+        logger.debug('Cannot analyse %s statically.', path)
+        return None
+    return info
@@ -0,0 +1,350 @@
+"""This module contains the timing report of the generation pipeline.
+
+The generation functions wrap their work in :func:`phase`. As long as no
+timing was started with :func:`start`, this does nothing. Otherwise the
+time is recorded per phase and per module.
+
+Imports can be profiled as well, see :func:`profile_import`. For each
+imported module the wall and CPU time and the modules it loaded are
+recorded. The :mod:`cProfile` statistics of the slowest imports are kept,
+so the transitive imports that make a module expensive can be inspected
+with :mod:`pstats`.
+"""
+import contextlib
+import cProfile
+import json
+import marshal
+import os
+import sys
+import time
+
+PHASES = ('walk', 'import', 'static', 'classify', 'classes', 'submodules', 'render', 'write', 'evict')
+"""The phases of the generation in the order they are reported."""
+
+_active = None
+"""The currently recording :class:`Timings`, if any."""
+
+
+class Timings(object):
+    """Recorded time per phase and per module."""
+
+    def __init__(self, imports=False, profiles=0):
+        """Initialize empty timings
+
+        :param imports: record the cost of every import, see :func:`profile_import`
+        :type imports: :class:`bool`
+        :param profiles: the number of slowest imports to keep the :mod:`cProfile` statistics of
+        :type profiles: :class:`int`
+        :raises: None
+        """
+        self.phases = {}
+        self.modules = {}
+        self.total = 0.0
+        self.imports = {} if imports else None
+        self.profiles = {}
+        self.profile_top = profiles
+
+    def add(self, name, seconds, module=None):
+        """Record the time of one call of a phase
+
+        :param name: the phase, see :data:`PHASES`
+        :type name: :class:`str`
+        :param seconds: the elapsed time
+        :type seconds: :class:`float`
+        :param module: the module the time is spent on
+        :type module: :class:`str` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        count = self.phases.setdefault(name, [0, 0.0])
+        count[0] += 1
+        count[1] += seconds
+        if module:
+            phases = self.modules.setdefault(module, {})
+            phases[name] = phases.get(name, 0.0) + seconds
+
+    def add_import(self, module, wall, cpu, loaded, stats=None):
+        """Record the cost of one import
+
+        :param module: the imported module
+        :type module: :class:`str`
+        :param wall: the elapsed time
+        :type wall: :class:`float`
+        :param cpu: the CPU time of the process
+        :type cpu: :class:`float`
+        :param loaded: the names of the modules that were added to :data:`sys.modules`
+        :type loaded: :class:`list`
+        :param stats: the statistics of :class:`cProfile.Profile`
+        :type stats: :class:`dict` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        entry = self.imports.setdefault(module, {'wall': 0.0, 'cpu': 0.0, 'loaded': []})
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+        entry['loaded'].extend(loaded)
+        if stats is not None:
+            self.profiles[module] = stats
+            for name in sorted(self.profiles, key=lambda m: self.imports[m]['wall'], reverse=True)[self.profile_top:]:
+                del self.profiles[name]
+
+    def merge(self, other):
+        """Add the recorded times of other timings, e.g. from a worker process
+
+        :param other: the timings to add
+        :type other: :class:`Timings`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        for name, (count, seconds) in other.phases.items():
+            mine = self.phases.setdefault(name, [0, 0.0])
+            mine[0] += count
+            mine[1] += seconds
+        for module, phases in other.modules.items():
+            mine = self.modules.setdefault(module, {})
+            for name, seconds in phases.items():
+                mine[name] = mine.get(name, 0.0) + seconds
+        self.merge_imports(other)
+
+    def merge_imports(self, other):
+        """Add the recorded imports and profiles of other timings
+
+        :param other: the timings to add
+        :type other: :class:`Timings`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self.imports is None or not other.imports:
+            return
+        for module, entry in other.imports.items():
+            self.add_import(module, entry['wall'], entry['cpu'], entry['loaded'], other.profiles.get(module))
+
+    def slowest(self, n):
+        """Return the n modules with the most recorded time
+
+        :param n: the number of modules
+        :type n: :class:`int`
+        :returns: tuples of module, total seconds and seconds per phase
+        :rtype: :class:`list`
+        :raises: None
+        """
+        totals = [(module, sum(phases.values()), phases) for module, phases in self.modules.items()]
+        totals.sort(key=lambda t: t[1], reverse=True)
+        return totals[:n]
+
+    def slowest_imports(self, n=None):
+        """Return the n imports with the most wall time
+
+        :param n: the number of imports or None for all
+        :type n: :class:`int` | None
+        :returns: tuples of module and the recorded wall time, CPU time and loaded modules
+        :rtype: :class:`list`
+        :raises: None
+        """
+        imports = sorted((self.imports or {}).items(), key=lambda i: i[1]['wall'], reverse=True)
+        return imports if n is None else imports[:n]
+
+    def save_profiles(self, directory):
+        """Write the kept :mod:`cProfile` statistics, one ``<module>.prof`` file per import
+
+        The files can be read with :class:`pstats.Stats`.
+
+        :param directory: the directory to write the files to
+        :type directory: :class:`str`
+        :returns: the written files
+        :rtype: :class:`list`
+        :raises: :class:`OSError` if the files cannot be written
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        files = []
+        for module, stats in sorted(self.profiles.items()):
+            filename = os.path.join(directory, '%s.prof' % module)
+            with open(filename, 'wb') as f:
+                marshal.dump(stats, f)
+            files.append(filename)
+        return files
+
+    def as_dict(self, n):
+        """Return the timings as a JSON serializable dict
+
+        :param n: the number of slowest modules to include
+        :type n: :class:`int`
+        :returns: the timings
+        :rtype: :class:`dict`
+        :raises: None
+        """
+        data = {'total': self.total,
+                'modules': len(self.modules),
+                'phases': dict((name, {'count': count, 'seconds': seconds})
+                               for name, (count, seconds) in self.phases.items()),
+                'slowest': [{'module': module, 'seconds': seconds, 'phases': phases}
+                            for module, seconds, phases in self.slowest(n)]}
+        if self.imports is not None:
+            data['imports'] = [{'module': module, 'wall': entry['wall'], 'cpu': entry['cpu'],
+                                'loaded': sorted(entry['loaded'])}
+                               for module, entry in self.slowest_imports()]
+        return data
+
+    def summary(self, n):
+        """Return a human readable report
+
+        :param n: the number of slowest modules to list
+        :type n: :class:`int`
+        :returns: the report
+        :rtype: :class:`str`
+        :raises: None
+        """
+        lines = ['jinjaapidoc timing: %.3fs total for %s modules' % (self.total, len(self.modules))]
+        for name in PHASES:
+            if name in self.phases:
+                count, seconds = self.phases[name]
+                lines.append('  %-12s %9.3fs %7d calls' % (name, seconds, count))
+        if self.modules:
+            lines.append('  slowest modules:')
+            for module, seconds, phases in self.slowest(n):
+                details = ', '.join('%s %.3fs' % (name, phases[name]) for name in PHASES if name in phases)
+                lines.append('  %9.3fs %s (%s)' % (seconds, module, details))
+        if self.imports:
+            lines.append('  slowest imports:')
+            for module, entry in self.slowest_imports(n):
+                lines.append('  %9.3fs wall %9.3fs cpu %6d modules loaded %s' % (
+                    entry['wall'], entry['cpu'], len(entry['loaded']), module))
+        return '\n'.join(lines)
+
+    def save(self, filename, n):
+        """Write the timings to a JSON file
+
+        :param filename: the file to write
+        :type filename: :class:`str`
+        :param n: the number of slowest modules to include
+        :type n: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(n), f, indent=2, sort_keys=True)
+
+
+def start(imports=False, profiles=0):
+    """Start recording and return the new timings
+
+    :param imports: record the cost of every import, see :func:`profile_import`
+    :type imports: :class:`bool`
+    :param profiles: the number of slowest imports to keep the :mod:`cProfile` statistics of
+    :type profiles: :class:`int`
+    :returns: the timings that record all phases until :func:`stop` is called
+    :rtype: :class:`Timings`
+    :raises: None
+    """
+    global _active
+    _active = Timings(imports, profiles)
+    return _active
+
+
+def stop():
+    """Stop recording
+
+    :returns: the timings that were recording or None
+    :rtype: :class:`Timings` | None
+    :raises: None
+    """
+    global _active
+    timings, _active = _active, None
+    return timings
+
+
+def active():
+    """Return the currently recording timings
+
+    :returns: the timings or None
+    :rtype: :class:`Timings` | None
+    :raises: None
+    """
+    return _active
+
+
+@contextlib.contextmanager
+def phase(name, module=None):
+    """Record the time spent in the with block if timings are recording
+
+    :param name: the phase, see :data:`PHASES`
+    :type name: :class:`str`
+    :param module: the module the time is spent on
+    :type module: :class:`str` | None
+    :raises: None
+    """
+    timings = _active
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start, module)
+
+
+@contextlib.contextmanager
+def profile_import(module):
+    """Record the cost of the import in the with block if the timings record imports
+
+    The wall time, the CPU time of the process and the modules that are new
+    in :data:`sys.modules` afterwards are recorded. If the timings keep
+    profiles, the import runs under :class:`cProfile.Profile`.
+
+    :param module: the imported module
+    :type module: :class:`str`
+    :raises: None
+    """
+    timings = _active
+    if timings is None or timings.imports is None:
+        yield
+        return
+    before = set(sys.modules)
+    profiler = cProfile.Profile() if timings.profile_top else None
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active
+            profiler = None
+    start = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        stats = None
+        if profiler is not None:
+            profiler.disable()
+            profiler.create_stats()
+            stats = profiler.stats
+        timings.add_import(module, wall, cpu, sorted(set(sys.modules) - before), stats)
+
+
+def timed_iter(iterable, name):
+    """Yield from the iterable and record the time spent producing each item
+
+    :param iterable: the iterable
+    :type iterable: iterable
+    :param name: the phase, see :data:`PHASES`
+    :type name: :class:`str`
+    :returns: generator of the items
+    :rtype: generator
+    :raises: None
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
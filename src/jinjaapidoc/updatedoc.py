@@ -0,0 +1,270 @@
+"""Command line interface to generate the rst files without running sphinx.
+
+This is useful as a pre-build step, e.g. in Makefiles or pre-commit hooks::
+
+  jinjaapidoc src/mypackage docs/reference
+
+No sphinx application is created. A lightweight stand-in provides the
+config and environment that :mod:`jinjaapidoc.gendoc` needs.
+
+The directory that contains SRC, or SRC itself if it is no package, is
+added to :data:`sys.path`, so the modules can be imported without
+setting ``PYTHONPATH``. The exit code is 1 if a module could not be imported.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import jinjaapidoc
+from jinjaapidoc import gendoc
+from jinjaapidoc import parallel
+from jinjaapidoc import watch
+
+
+class Environment(object):
+    """Stand-in for the :class:`sphinx.environment.BuildEnvironment`."""
+
+    def __init__(self, srcdir):
+        """Initialize the environment
+
+        :param srcdir: the documentation source directory
+        :type srcdir: :class:`str`
+        :raises: None
+        """
+        self.srcdir = srcdir
+        self.found_docs = set()
+
+    def relfn2path(self, filename, docname=None):
+        """Return the filename relative to the srcdir and the absolute path
+
+        Like sphinx, filenames starting with a slash are relative to the srcdir.
+
+        :param filename: the filename
+        :type filename: :class:`str`
+        :param docname: ignored
+        :type docname: :class:`str` | None
+        :returns: the relative and the absolute filename
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        rel = filename.lstrip(os.sep)
+        return rel, os.path.join(self.srcdir, rel)
+
+
+class App(object):
+    """Stand-in for the :class:`sphinx.application.Sphinx`."""
+
+    def __init__(self, config, srcdir, doctreedir):
+        """Initialize the app
+
+        :param config: the jinjaapi config values
+        :type config: :class:`dict`
+        :param srcdir: the documentation source directory
+        :type srcdir: :class:`str`
+        :param doctreedir: the directory for the context cache
+        :type doctreedir: :class:`str`
+        :raises: None
+        """
+        self.config = parallel.WorkerConfig(config)
+        self.env = Environment(srcdir)
+        self.doctreedir = doctreedir
+
+
+CACHE_DIR = '.jinjaapidoc-cache'
+"""Default directory for the context cache and compiled templates, next to DEST."""
+
+
+def get_import_path(src):
+    """Return the directory to add to :data:`sys.path` to import the modules in src
+
+    :param src: the path to the python source files
+    :type src: :class:`str`
+    :returns: the parent directory if src is a package, else src
+    :rtype: :class:`str`
+    :raises: None
+    """
+    src = os.path.normpath(os.path.abspath(src))
+    if os.path.isfile(os.path.join(src, gendoc.INITPY)):
+        return os.path.dirname(src)
+    return src
+
+
+def get_cache_dir(dest):
+    """Return the default directory for the context cache outside of DEST
+
+    It is not inside DEST, so ``--delete`` does not remove it.
+
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :returns: the directory :data:`CACHE_DIR` next to DEST
+    :rtype: :class:`str`
+    :raises: None
+    """
+    return os.path.join(os.path.dirname(os.path.normpath(os.path.abspath(dest))), CACHE_DIR)
+
+
+def make_config(**values):
+    """Return the default jinjaapi config values updated with the given values
+
+    :param values: config values without the ``jinjaapi_`` prefix
+    :returns: the config values
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    config = dict((name, default) for name, default, rebuild in jinjaapidoc.CONFIG_VALUES)
+    for name, value in values.items():
+        config['jinjaapi_' + name] = value
+    return config
+
+
+def make_parser():
+    """Return the argument parser for the command line interface
+
+    :returns: the parser
+    :rtype: :class:`argparse.ArgumentParser`
+    :raises: None
+    """
+    parser = argparse.ArgumentParser(
+        prog='jinjaapidoc',
+        description='Generate rst files for the python modules in SRC with jinja templates.')
+    parser.add_argument('src', metavar='SRC', help='path to the python source files')
+    parser.add_argument('dest', metavar='DEST', help='output directory')
+    parser.add_argument('exclude', metavar='EXCLUDE', nargs='*', help='paths or glob patterns to exclude')
+    parser.add_argument('-t', '--templatedir', action='append', default=[],
+                        help='directory with user templates. Can be given multiple times.')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='do not create any files')
+    parser.add_argument('-d', '--delete', action='store_true', help='delete the output directory first')
+    parser.add_argument('--no-force', action='store_true', help='do not overwrite existing files')
+    parser.add_argument('--no-private', action='store_true', help='exclude "_private" modules')
+    parser.add_argument('--no-followlinks', action='store_true', help='do not follow symbolic links')
+    parser.add_argument('--no-include-from-all', action='store_true',
+                        help='do not include members listed in __all__ that are declared elsewhere')
+    parser.add_argument('--cache', action='store_true', help='reuse the contexts of unchanged modules')
+    parser.add_argument('--cache-dir', help='directory for the context cache and compiled templates. '
+                        'Defaults to %s next to DEST for the context cache. '
+                        'Templates are only cached if this is given.' % CACHE_DIR)
+    parser.add_argument('--precompile', action='store_true',
+                        help='load the built-in templates from precompiled modules. Requires --cache-dir.')
+    parser.add_argument('--static', action='store_true', help='parse the sources instead of importing them')
+    parser.add_argument('--stubs', action='store_true',
+                        help='read .pyi stubs and cython sources instead of importing the modules')
+    parser.add_argument('--sync', action='store_true', help='delete only the files of removed modules')
+    parser.add_argument('--isolate', action='store_true', help='import the modules in a separate worker process')
+    parser.add_argument('--import-timeout', type=float, default=60,
+                        help='seconds an isolated import may take, 0 for no limit. Default: 60')
+    parser.add_argument('--import-memory-limit', type=int, default=0,
+                        help='memory ceiling of the isolated import worker in megabytes')
+    parser.add_argument('--evict', action='store_true',
+                        help='unload the imported modules after each package to bound the memory usage')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--writers', type=int, default=0,
+                        help='number of threads that write the files in the background, e.g. on network filesystems')
+    parser.add_argument('--page-size', type=int, default=0,
+                        help='split the functions and data of modules with more members into pages')
+    parser.add_argument('--page-grouping', choices=gendoc.PAGE_GROUPINGS, default='chunk',
+                        help='how to group the members into pages. Default: chunk')
+    parser.add_argument('--inventory', default='',
+                        help='also write an inventory of the modules to this file, relative to DEST')
+    parser.add_argument('--plan', action='store_true',
+                        help='only print the files that would be created, updated or deleted, '
+                        'without importing the modules. Use --cache or --sync for a precise plan.')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='keep running and regenerate the pages of changed modules')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between two polls in watch mode if watchdog is not installed. Default: 1')
+    parser.add_argument('--timing', action='store_true', help='log the time spent per phase and module')
+    parser.add_argument('--timing-file', default='', help='also write the timing report to this JSON file')
+    parser.add_argument('--timing-top', type=int, default=10, help='number of slowest modules to report')
+    parser.add_argument('--profile-imports', action='store_true',
+                        help='report the wall time, CPU time and loaded modules of every import')
+    parser.add_argument('--profile-dir', default='',
+                        help='also write cProfile statistics of the slowest imports to this directory')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='log more, can be given twice')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only log warnings and errors')
+    return parser
+
+
+def print_plan(report):
+    """Print the files that would be created, updated or deleted, one per line
+
+    :param report: the report of :func:`jinjaapidoc.gendoc.plan`
+    :type report: :class:`jinjaapidoc.gendoc.GenerationReport`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    for status in (gendoc.CREATED, gendoc.UPDATED, gendoc.DELETED):
+        for fname in sorted(report.files[status]):
+            sys.stdout.write('%s %s\n' % (status, fname))
+
+
+def main(argv=None):
+    """Run the command line interface
+
+    :param argv: the arguments without the program name. Defaults to :data:`sys.argv`.
+    :type argv: :class:`list` | None
+    :returns: the exit code
+    :rtype: :class:`int`
+    :raises: None
+    """
+    args = make_parser().parse_args(argv)
+    if args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.DEBUG if args.verbose > 1 else logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
+    config = make_config(srcdir=args.src,
+                         outputdir=args.dest,
+                         exclude_paths=args.exclude,
+                         dryrun=args.dry_run,
+                         nodelete=not args.delete,
+                         force=not args.no_force,
+                         includeprivate=not args.no_private,
+                         followlinks=not args.no_followlinks,
+                         include_from_all=not args.no_include_from_all,
+                         cache=args.cache,
+                         static_analysis=args.static,
+                         stubs=args.stubs,
+                         sync=args.sync,
+                         workers=args.workers,
+                         timing=args.timing or bool(args.timing_file),
+                         timing_file=args.timing_file,
+                         timing_top=args.timing_top,
+                         template_cache=bool(args.cache_dir),
+                         precompile_templates=bool(args.cache_dir) and args.precompile,
+                         isolate=args.isolate,
+                         import_timeout=args.import_timeout,
+                         import_memory_limit=args.import_memory_limit,
+                         evict_modules=args.evict,
+                         writer_threads=args.writers,
+                         page_size=args.page_size,
+                         page_grouping=args.page_grouping,
+                         inventory=args.inventory,
+                         plan=args.plan,
+                         profile_imports=args.profile_imports,
+                         profile_dir=args.profile_dir)
+    app = App(config, args.dest, args.cache_dir or get_cache_dir(args.dest))
+    template_dirs = args.templatedir + [gendoc.get_template_dir(gendoc.TEMPLATE_DIR)]
+    path = get_import_path(args.src)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    try:
+        report = gendoc.update(app, args.src, args.dest, template_dirs)
+        if args.plan:
+            print_plan(report)
+        elif args.watch:
+            watch.watch(app, args.src, args.dest, template_dirs, args.interval)
+    except OSError as e:
+        sys.stderr.write('jinjaapidoc: %s\n' % e)
+        return 1
+    if report.failures and not args.watch:
+        sys.stderr.write('jinjaapidoc: %s modules could not be imported: %s\n' % (
+            len(report.failures), ', '.join(report.failures)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
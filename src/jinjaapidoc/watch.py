@@ -0,0 +1,344 @@
+"""This module contains the watch mode of the command line interface.
+
+After a full generation, the source tree is watched for changed python
+files and stubs. Only the page of the changed module and the page of its parent
+package are generated again, so the time from saving a file to an updated
+page does not depend on the size of the tree.
+
+Changes are detected with `watchdog <https://pypi.org/project/watchdog/>`_
+if it is installed, which uses inotify on linux. Otherwise the tree is
+polled.
+"""
+import os
+import queue
+import time
+
+from sphinx.util import logging
+
+from jinjaapidoc import gendoc
+from jinjaapidoc import isolate
+
+try:
+    from watchdog import events as wdevents
+    from watchdog import observers as wdobservers
+except ImportError:
+    wdevents = wdobservers = None
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 0.1
+"""Seconds to wait for more changes after the first one, e.g. when an editor saves several files."""
+
+
+class PollingWatcher(object):
+    """Detects changes by comparing snapshots of the tree."""
+
+    def __init__(self, src, excludes, private, followlinks, interval=1.0):
+        """Initialize a new watcher and take the first snapshot
+
+        :param src: the path to the python source files
+        :type src: :class:`str`
+        :param excludes: the paths and patterns to exclude
+        :type excludes: :class:`jinjaapidoc.gendoc.ExcludeMatcher`
+        :param private: include "_private" modules
+        :type private: :class:`bool`
+        :param followlinks: follow symbolic links
+        :type followlinks: :class:`bool`
+        :param interval: seconds between two snapshots
+        :type interval: :class:`float`
+        :raises: None
+        """
+        self.args = (src, excludes, private, followlinks)
+        self.interval = interval
+        self.stamps = gendoc.get_stamps(*self.args)
+
+    def poll(self):
+        """Return the files that were created, changed or deleted since the last call
+
+        :returns: the paths
+        :rtype: :class:`set`
+        :raises: None
+        """
+        stamps = gendoc.get_stamps(*self.args)
+        changed = set(path for path, stamp in stamps.items() if self.stamps.get(path) != stamp)
+        changed.update(set(self.stamps) - set(stamps))
+        self.stamps = stamps
+        return changed
+
+    def wait(self):
+        """Block until files changed and return them
+
+        :returns: the paths
+        :rtype: :class:`set`
+        :raises: None
+        """
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            time.sleep(self.interval)
+
+    def close(self):
+        """Stop watching
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+
+
+class EventWatcher(object):
+    """Detects changes with the events of :mod:`watchdog`."""
+
+    def __init__(self, src, excludes, private, followlinks):
+        """Initialize a new watcher and start observing the tree
+
+        :param src: the path to the python source files
+        :type src: :class:`str`
+        :param excludes: the paths and patterns to exclude
+        :type excludes: :class:`jinjaapidoc.gendoc.ExcludeMatcher`
+        :param private: include "_private" modules
+        :type private: :class:`bool`
+        :param followlinks: ignored, the observer watches the tree as it is
+        :type followlinks: :class:`bool`
+        :raises: None
+        """
+        self.excludes = excludes
+        self.queue = queue.Queue()
+        handler = wdevents.FileSystemEventHandler()
+        handler.on_any_event = self.on_event
+        self.observer = wdobservers.Observer()
+        self.observer.schedule(handler, src, recursive=True)
+        self.observer.start()
+
+    def on_event(self, event):
+        """Queue the paths of the event, called in the observer thread
+
+        :param event: the event
+        :type event: :class:`watchdog.events.FileSystemEvent`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', None)):
+            if path and gendoc.is_source(path) and not self.excludes.match(path):
+                self.queue.put(path)
+
+    def wait(self):
+        """Block until files changed and return them
+
+        :returns: the paths
+        :rtype: :class:`set`
+        :raises: None
+        """
+        changed = set([self.queue.get()])
+        time.sleep(DEBOUNCE)
+        while True:
+            try:
+                changed.add(self.queue.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def close(self):
+        """Stop watching
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.observer.stop()
+        self.observer.join()
+
+
+def create_watcher(src, excludes, private, followlinks, interval=1.0):
+    """Return an :class:`EventWatcher` if watchdog is installed and a :class:`PollingWatcher` otherwise
+
+    :returns: the watcher
+    :rtype: :class:`EventWatcher` | :class:`PollingWatcher`
+    :raises: None
+    """
+    if wdobservers is not None:
+        logger.info('Watching %s for changes.', src)
+        return EventWatcher(src, excludes, private, followlinks)
+    logger.info('Watching %s for changes every %ss. Install watchdog to use filesystem events.', src, interval)
+    return PollingWatcher(src, excludes, private, followlinks, interval)
+
+
+def get_pages(app, src, path, excludes, private):
+    """Return the pages that are affected by a change of the given file
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: the normalized absolute path to the python source files
+    :type src: :class:`str`
+    :param path: the absolute path of the changed file
+    :type path: :class:`str`
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`jinjaapidoc.gendoc.ExcludeMatcher`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :returns: tuples of the root package, the name without root, the path of the
+              module file or package directory and whether it is a package.
+              The page of the changed module comes first, then the page of its parent package.
+              For a ``.pyi`` stub, the path of the module source is returned if there is one.
+    :rtype: :class:`list`
+    :raises: None
+    """
+    if not gendoc.is_source(path) or excludes.match(path) or not path.startswith(src + os.sep):
+        return []
+    root_package = os.path.basename(src) if os.path.isfile(os.path.join(src, gendoc.INITPY)) else None
+    dirs = os.path.relpath(os.path.dirname(path), src).split(os.sep)
+    if dirs == ['.']:
+        dirs = []
+    modname = os.path.splitext(os.path.basename(path))[0]
+    ispkg = modname == '__init__'
+    exclude_prefixes = gendoc.get_exclude_prefixes(private)
+    directory = src
+    for i, d in enumerate(dirs):
+        directory = os.path.join(directory, d)
+        if d.startswith(exclude_prefixes) or excludes.match(directory):
+            return []
+        # the package itself may just have been deleted
+        if (i < len(dirs) - 1 or not ispkg) and not os.path.isfile(os.path.join(directory, gendoc.INITPY)):
+            return []
+    if ispkg:
+        if not dirs:
+            return [(root_package, '', src, True)] if root_package else []
+        pages = [(root_package, '.'.join(dirs), directory, True)]
+    else:
+        if gendoc.shall_skip(app, modname, private):
+            return []
+        if path.endswith(gendoc.STUB_SUFFIX):
+            source = gendoc.find_module_path(os.path.dirname(path), modname)
+            if source is not None and os.path.isfile(source):
+                path = source
+            elif not app.config.jinjaapi_stubs:
+                return []
+        if not dirs and root_package is None:
+            return [(None, modname, path, False)]
+        pages = [(gendoc.makename(root_package, '.'.join(dirs)), modname, path, False)]
+        dirs.append(modname)
+    if len(dirs) > 1 or root_package:
+        pages.append((root_package, '.'.join(dirs[:-1]), os.path.dirname(pages[0][2]), True))
+    return pages
+
+
+def regenerate(app, env, src, dest, paths, excludes, private, followlinks, suffix='rst', report=None,
+               cache=None, importer=None):
+    """Generate the pages affected by the changed files again
+
+    Changed modules are imported again. Pages of deleted modules are removed.
+    Like :func:`jinjaapidoc.gendoc.update`, the contexts of unchanged modules
+    are taken from the cache and ``jinjaapi_force`` is respected.
+
+    :param app: the sphinx app
+    :type app: :class:`sphinx.application.Sphinx`
+    :param env: the jinja environment
+    :type env: :class:`jinja2.Environment`
+    :param src: the normalized absolute path to the python source files
+    :type src: :class:`str`
+    :param dest: the output directory
+    :type dest: :class:`str`
+    :param paths: the changed files
+    :type paths: iterable
+    :param excludes: the paths and patterns to exclude
+    :type excludes: :class:`jinjaapidoc.gendoc.ExcludeMatcher`
+    :param private: include "_private" modules
+    :type private: :class:`bool`
+    :param followlinks: follow symbolic links
+    :type followlinks: :class:`bool`
+    :param suffix: the file extension
+    :type suffix: :class:`str`
+    :param report: the report to record the outcome of each file in
+    :type report: :class:`jinjaapidoc.gendoc.GenerationReport` | None
+    :param cache: the context cache
+    :type cache: :class:`jinjaapidoc.cache.ContextCache` | None
+    :param importer: the importer for isolation mode. Its worker is restarted to import the changed modules again.
+    :type importer: :class:`jinjaapidoc.isolate.IsolatedImporter` | None
+    :returns: the names of the generated pages
+    :rtype: :class:`list`
+    :raises: None
+    """
+    pages = []
+    for path in sorted(paths):
+        affected = get_pages(app, src, path, excludes, private)
+        if affected:
+            gendoc.unload_module(gendoc.makename(*affected[0][:2]))
+        for page in affected:
+            if page not in pages:
+                pages.append(page)
+    if pages and importer is not None:
+        importer.close()
+    dryrun = app.config.jinjaapi_dryrun
+    force = app.config.jinjaapi_force
+    names = []
+    for package, name, path, ispkg in pages:
+        fullname = gendoc.makename(package, name)
+        if not os.path.exists(path) or (ispkg and not os.path.isfile(os.path.join(path, gendoc.INITPY))):
+            fname = os.path.join(dest, '%s.%s' % (fullname, suffix))
+            if os.path.isfile(fname) and not dryrun:
+                logger.info('Removing file %s.', fname)
+                os.remove(fname)
+                if report is not None:
+                    report.add(gendoc.DELETED, fname)
+            continue
+        if ispkg:
+            subs, descend, files = gendoc.scan_dir(path, excludes, private, followlinks, True)
+            entry = gendoc.make_package_entry(app, path, subs, files, private)
+            gendoc.create_package_file(app, env, package, name, private, dest, suffix, dryrun, force,
+                                       report, cache, path, importer, entry, submodules=False)
+        else:
+            gendoc.create_module_file(app, env, package, name, dest, suffix, dryrun, force, report,
+                                      cache, path, importer)
+        names.append(fullname)
+    return names
+
+
+def watch(app, src, out, template_dirs, interval=1.0):
+    """Watch the source tree and regenerate the affected pages until interrupted
+
+    Call :func:`jinjaapidoc.gendoc.update` first for the full generation.
+
+    :param app: the sphinx app or a stand-in with ``config`` and ``env``
+    :type app: :class:`sphinx.application.Sphinx`
+    :param src: path to python source files
+    :type src: :class:`str`
+    :param out: output directory
+    :type out: :class:`str`
+    :param template_dirs: directories to search for templates
+    :type template_dirs: :class:`list`
+    :param interval: seconds between two polls if watchdog is not installed
+    :type interval: :class:`float`
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    c = app.config
+    src = os.path.normpath(os.path.abspath(src))
+    excludes = gendoc.ExcludeMatcher(c.jinjaapi_exclude_paths, src)
+    private = c.jinjaapi_includeprivate
+    env = gendoc.create_environment(template_dirs)
+    cache = gendoc.create_cache(app)
+    importer = isolate.create_importer(app)
+    watcher = create_watcher(src, excludes, private, c.jinjaapi_followlinks, interval)
+    try:
+        while True:
+            paths = watcher.wait()
+            start = time.perf_counter()
+            report = gendoc.GenerationReport()
+            names = regenerate(app, env, src, out, paths, excludes, private, c.jinjaapi_followlinks,
+                               report=report, cache=cache, importer=importer)
+            if names and cache is not None and not c.jinjaapi_dryrun:
+                cache.templates = gendoc.get_template_fingerprint(template_dirs)
+                cache.save()
+            if names:
+                logger.info('jinjaapidoc: regenerated %s in %.3fs: %s.', ', '.join(names),
+                            time.perf_counter() - start, report.summary())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if importer is not None:
+            importer.close()
@@ -0,0 +1,111 @@
+"""This module contains the background writing of the generated files.
+
+On slow or network filesystems the time to write each file adds up
+linearly with the number of pages. The :class:`FileWriter` writes the files
+in a thread pool while the next modules are introspected and rendered.
+Registering the documents in the sphinx environment and recording the
+outcome happens in the main thread.
+"""
+import concurrent.futures
+import time
+
+from jinjaapidoc import gendoc
+from jinjaapidoc import timing
+
+
+def write(fname, data, dryrun, force):
+    """Write the file in a writer thread
+
+    :param fname: the path of the file
+    :type fname: :class:`str`
+    :param data: the content
+    :type data: :class:`bytes`
+    :param dryrun: do not create the file
+    :type dryrun: :class:`bool`
+    :param force: overwrite an existing file
+    :type force: :class:`bool`
+    :returns: the outcome and the elapsed seconds
+    :rtype: :class:`tuple`
+    :raises: :class:`OSError` if the file cannot be written
+    """
+    start = time.perf_counter()
+    status = gendoc._write_file(fname, data, dryrun, force)
+    return status, time.perf_counter() - start
+
+
+class FileWriter(object):
+    """Writes files in a thread pool with a bounded number of pending files."""
+
+    def __init__(self, app, threads=4, max_pending=None, report=None):
+        """Initialize a new writer
+
+        :param app: the sphinx app
+        :type app: :class:`sphinx.application.Sphinx`
+        :param threads: the number of writer threads
+        :type threads: :class:`int`
+        :param max_pending: the number of files that may wait to be written.
+                            Defaults to 8 per thread.
+        :type max_pending: :class:`int` | None
+        :param report: the report to record the outcome of each file in
+        :type report: :class:`jinjaapidoc.gendoc.GenerationReport` | None
+        :raises: None
+        """
+        self.app = app
+        self.max_pending = max_pending or threads * 8
+        self.report = report
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+        self.pending = {}
+
+    def submit(self, name, fname, data, dryrun, force):
+        """Queue the file for writing
+
+        Blocks while the queue is full.
+
+        :param name: the module or package name
+        :type name: :class:`str`
+        :param fname: the path of the file
+        :type fname: :class:`str`
+        :param data: the content
+        :type data: :class:`bytes`
+        :param dryrun: do not create the file
+        :type dryrun: :class:`bool`
+        :param force: overwrite an existing file
+        :type force: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: :class:`OSError` if a previous file could not be written
+        """
+        while len(self.pending) >= self.max_pending:
+            self.wait(concurrent.futures.FIRST_COMPLETED)
+        future = self.executor.submit(write, fname, data, dryrun, force)
+        self.pending[future] = (name, fname)
+
+    def wait(self, return_when=concurrent.futures.ALL_COMPLETED):
+        """Wait for pending files and register the written ones
+
+        :param return_when: see :func:`concurrent.futures.wait`
+        :returns: None
+        :rtype: None
+        :raises: :class:`OSError` if a file could not be written
+        """
+        done, _ = concurrent.futures.wait(self.pending, return_when=return_when)
+        for future in done:
+            name, fname = self.pending.pop(future)
+            status, seconds = future.result()
+            timings = timing.active()
+            if timings is not None:
+                timings.add('write', seconds, name)
+            gendoc.finish_write(self.app, fname, status, self.report)
+
+    def close(self):
+        """Wait for all pending files and stop the threads
+
+        :returns: None
+        :rtype: None
+        :raises: :class:`OSError` if a file could not be written
+        """
+        try:
+            if self.pending:
+                self.wait()
+        finally:
+            self.executor.shutdown()
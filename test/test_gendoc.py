@@ -0,0 +1,631 @@
+"""
+Tests for `jinjaapidoc.gendoc` module.
+"""
+import multiprocessing
+import os
+import pstats
+import sys
+
+import pytest
+
+import jinjaapidoc
+from jinjaapidoc import cache, gendoc, isolate, parallel, timing, updatedoc, watch
+from jinjaapidoc import inventory as apiinventory
+
+
+class FakeEnv(object):
+    """Minimal stand-in for :class:`sphinx.environment.BuildEnvironment`"""
+
+    def __init__(self, srcdir):
+        self.srcdir = srcdir
+        self.found_docs = set()
+
+    def relfn2path(self, filename, docname=None):
+        rel = filename.lstrip(os.sep)
+        return rel, os.path.join(self.srcdir, rel)
+
+
+class FakeApp(object):
+    """Minimal stand-in for :class:`sphinx.application.Sphinx`"""
+
+    def __init__(self, srcdir):
+        self.env = FakeEnv(srcdir)
+        self.config = parallel.WorkerConfig(updatedoc.make_config())
+
+
+@pytest.fixture(scope='function')
+def app(tmpdir):
+    return FakeApp(str(tmpdir))
+
+
+@pytest.fixture(scope='function')
+def template_dirs():
+    return [os.path.join(os.path.dirname(gendoc.__file__), gendoc.TEMPLATE_DIR)]
+
+
+@pytest.fixture(scope='function')
+def srcpkg(tmpdir):
+    """Create a small package ``fakepkg`` on sys.path and remove it afterwards"""
+    src = tmpdir.mkdir('src')
+    pkg = src.mkdir('fakepkg')
+    pkg.join('__init__.py').write('"""Package"""\n')
+    pkg.join('mod.py').write('class Foo(object):\n    pass\n\n\nclass Err(ValueError):\n    pass\n\n\n'
+                             'def bar():\n    pass\n\n\nVALUE = 1\n')
+    sys.path.insert(0, str(src))
+    yield str(pkg)
+    sys.path.remove(str(src))
+    for name in list(sys.modules):
+        if name.startswith('fakepkg'):
+            del sys.modules[name]
+
+
+@pytest.fixture(scope='function')
+def reexppkg(srcpkg):
+    """Let ``fakepkg`` re-export the members of ``fakepkg.mod`` listed in its ``__all__``"""
+    with open(os.path.join(srcpkg, '__init__.py'), 'w') as f:
+        f.write('from .mod import *  # noqa\nfrom .mod import __all__  # noqa\n')
+    with open(os.path.join(srcpkg, 'mod.py'), 'a') as f:
+        f.write('\n__all__ = ["bar"]\n')
+    return srcpkg
+
+
+def add_reexported(srcpkg):
+    """Add the function ``baz`` to the ``__all__`` of ``fakepkg.mod`` and unload the package"""
+    with open(os.path.join(srcpkg, 'mod.py'), 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n\n\n__all__.append("baz")\n')
+    gendoc.unload_module('fakepkg.mod')
+    gendoc.unload_module('fakepkg')
+
+
+def test_write_file_keeps_unchanged(app, tmpdir):
+    dest = str(tmpdir)
+    report = gendoc.GenerationReport()
+    assert gendoc.write_file(app, 'mod', u'text', dest, 'rst', False, True, report) == gendoc.CREATED
+    fname = os.path.join(dest, 'mod.rst')
+    os.utime(fname, (0, 0))
+    assert gendoc.write_file(app, 'mod', u'text', dest, 'rst', False, True, report) == gendoc.UNCHANGED
+    assert os.path.getmtime(fname) == 0
+    assert gendoc.write_file(app, 'mod', u'other', dest, 'rst', False, True, report) == gendoc.UPDATED
+    assert gendoc.write_file(app, 'mod', u'text', dest, 'rst', False, False, report) == gendoc.SKIPPED
+    assert report.summary() == '1 created, 1 updated, 1 unchanged, 1 skipped, 0 deleted'
+    assert app.env.found_docs == set(['mod'])
+
+
+def test_context_cache(app, srcpkg, tmpdir):
+    filename = str(tmpdir.join('cache.json'))
+    path = os.path.join(srcpkg, 'mod.py')
+    c = cache.ContextCache(filename, 'key')
+    var = gendoc.get_cached_context(app, 'fakepkg', 'mod', 'fakepkg.mod', path, c)
+    assert var['classes'] == ['Foo']
+    c.save()
+
+    del sys.modules['fakepkg.mod']
+    c = cache.ContextCache(filename, 'key')
+    c.load()
+    cached = gendoc.get_cached_context(app, 'fakepkg', 'mod', 'fakepkg.mod', path, c)
+    assert cached['classes'] == ['Foo']
+    assert cached['functions'] == ['bar']
+    assert c.hits == 1
+    assert 'fakepkg.mod' not in sys.modules
+
+    c = cache.ContextCache(filename, 'otherkey')
+    c.load()
+    assert c.get(path) is None
+
+
+def test_context_cache_depends(app, srcpkg, tmpdir):
+    c = cache.ContextCache(str(tmpdir.join('cache.json')), 'key')
+    with open(os.path.join(srcpkg, '__init__.py'), 'w') as f:
+        f.write('from .mod import *  # noqa\nfrom .mod import __all__  # noqa\n')
+    with open(os.path.join(srcpkg, 'mod.py'), 'a') as f:
+        f.write('\n__all__ = ["bar"]\n')
+    var = gendoc.get_cached_context(app, '', 'fakepkg', 'fakepkg', srcpkg, c)
+    assert var['functions'] == ['bar']
+    assert var['depends'] == [os.path.join(srcpkg, 'mod.py')]
+    assert c.is_current(srcpkg)
+
+    with open(os.path.join(srcpkg, 'mod.py'), 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n\n\n__all__.append("baz")\n')
+    gendoc.unload_module('fakepkg.mod')
+    gendoc.unload_module('fakepkg')
+    assert not c.is_current(srcpkg)
+    var = gendoc.get_cached_context(app, '', 'fakepkg', 'fakepkg', srcpkg, c)
+    assert var['functions'] == ['bar', 'baz']
+    assert c.misses == 2
+
+
+def test_cache_key():
+    config = parallel.WorkerConfig(updatedoc.make_config())
+    key = cache.make_key(config)
+    for name, value in (('timing', True), ('workers', 4), ('writer_threads', 2), ('inventory', 'api.jsonl'),
+                        ('profile_imports', True), ('plan', True)):
+        setattr(config, 'jinjaapi_' + name, value)
+    assert cache.make_key(config) == key
+    config.jinjaapi_static_analysis = True
+    assert cache.make_key(config) != key
+
+
+def test_static_context(app, srcpkg):
+    app.config.jinjaapi_static_analysis = True
+    path = os.path.join(srcpkg, 'mod.py')
+    var = gendoc.get_context(app, 'fakepkg', 'mod', 'fakepkg.mod', path)
+    assert 'fakepkg.mod' not in sys.modules
+    app.config.jinjaapi_static_analysis = False
+    imported = gendoc.get_context(app, 'fakepkg', 'mod', 'fakepkg.mod', path)
+    for key in ('classes', 'allclasses', 'exceptions', 'functions', 'data', 'alldata', 'members'):
+        assert var[key] == imported[key]
+
+
+def test_static_context_resolves_imported(app, srcpkg):
+    path = os.path.join(srcpkg, 'compat.py')
+    with open(path, 'w') as f:
+        f.write('"""Compatibility helpers"""\n'
+                'import re\nimport sys\nfrom collections import OrderedDict\n'
+                'from os.path import join\nfrom string import ascii_letters as LETTERS\n\n'
+                'PY2 = sys.version_info[0] == 2\ntext_type = str\nstring_types = (str,)\n'
+                'pattern_type = type(re.compile(""))\nDEFAULT_SIZE = 10\n\n'
+                'try:\n    from os import fspath\nexcept ImportError:\n    def fspath(path):\n        return path\n\n'
+                'if PY2:\n    range_type = xrange  # noqa\nelse:\n    range_type = range\n\n\n'
+                'class Local(OrderedDict):\n    pass\n\n\ndef helper():\n    return join\n')
+    app.config.jinjaapi_static_analysis = True
+    var = gendoc.get_context(app, 'fakepkg', 'compat', 'fakepkg.compat', path)
+    assert 'fakepkg.compat' not in sys.modules
+    assert var['classes'] == ['Local']
+    assert var['functions'] == ['fspath', 'helper']
+    assert var['data'] == ['DEFAULT_SIZE', 'PY2', 'pattern_type', 'range_type', 'string_types', 'text_type']
+
+    public = ['LETTERS', 'Local', 'OrderedDict', 'fspath', 'helper', 'text_type']
+    with open(path, 'a') as f:
+        f.write('\n\n__all__ = %r\n' % public)
+    var = gendoc.get_context(app, 'fakepkg', 'compat', 'fakepkg.compat', path)
+    assert 'fakepkg.compat' in sys.modules
+    gendoc.unload_module('fakepkg.compat')
+    app.config.jinjaapi_static_analysis = False
+    imported = gendoc.get_context(app, 'fakepkg', 'compat', 'fakepkg.compat', path)
+    assert imported['allclasses'] == ['Local', 'OrderedDict']
+    assert [x for x in imported['alldata'] if x in public] == ['LETTERS', 'fspath']
+    for key in ('allclasses', 'allexceptions', 'allfunctions', 'alldata'):
+        assert [x for x in var[key] if x in public] == [x for x in imported[key] if x in public]
+
+
+def test_static_context_imported_all(app, reexppkg):
+    app.config.jinjaapi_static_analysis = True
+    var = gendoc.get_context(app, '', 'fakepkg', 'fakepkg', reexppkg)
+    assert 'fakepkg' in sys.modules
+    assert var['functions'] == ['bar']
+
+
+def test_generate_parallel(app, srcpkg, template_dirs, tmpdir):
+    serial = str(tmpdir.mkdir('serial'))
+    gendoc.generate(app, srcpkg, serial, template_dirs=template_dirs)
+    par = str(tmpdir.mkdir('parallel'))
+    report = gendoc.generate(app, srcpkg, par, template_dirs=template_dirs, workers=2)
+    assert report.count(gendoc.CREATED) == 2
+    for name in ('fakepkg.rst', 'fakepkg.mod.rst'):
+        assert tmpdir.join('parallel', name).read() == tmpdir.join('serial', name).read()
+
+
+def test_get_workers(app):
+    app.parallel = 4
+    assert parallel.get_workers(app) == 1
+    app.config.jinjaapi_workers = 2
+    assert parallel.get_workers(app) == 2
+
+
+def test_inventory(app, srcpkg):
+    from fakepkg import mod
+    inventory = gendoc.get_inventory(app, mod)
+    assert not hasattr(inventory, '__dict__')
+    assert inventory.get('class') == (['Foo'], ['Foo'])
+    assert inventory.get('exception') == (['Err'], ['Err'])
+    assert inventory.get('function') == (['bar'], ['bar'])
+    assert 'VALUE' in inventory.get('data')[0]
+    for typ in ('class', 'exception', 'function', 'data', 'members'):
+        assert gendoc.get_members(app, mod, typ) == inventory.get(typ)
+
+
+def test_sync_dir(app, srcpkg, template_dirs, tmpdir):
+    dest = tmpdir.mkdir('out')
+    dest.join('fakepkg.old.rst').write('old')
+    dest.mkdir('fakepkg.old').join('fakepkg.old.Foo.rst').write('old')
+    gendoc.write_manifest(str(dest), ['fakepkg.old.rst', 'fakepkg.mod.rst'])
+    report = gendoc.generate(app, srcpkg, str(dest), force=True, template_dirs=template_dirs)
+    gendoc.sync_dir(app, str(dest), report)
+    assert report.count(gendoc.DELETED) == 1
+    assert sorted(os.listdir(str(dest))) == [gendoc.MANIFEST_FILENAME, 'fakepkg.mod.rst', 'fakepkg.rst']
+    assert gendoc.read_manifest(str(dest)) == ['fakepkg.mod.rst', 'fakepkg.rst']
+
+
+def test_sync_reexported(reexppkg, template_dirs, tmpdir):
+    app = updatedoc.App(updatedoc.make_config(sync=True), str(tmpdir), str(tmpdir.mkdir('doctrees')))
+    dest = tmpdir.join('out')
+    gendoc.update(app, reexppkg, str(dest), template_dirs)
+    assert 'baz' not in dest.join('fakepkg.rst').read()
+    add_reexported(reexppkg)
+    report = gendoc.update(app, reexppkg, str(dest), template_dirs)
+    assert sorted(report.files[gendoc.UPDATED]) == [str(dest.join('fakepkg.mod.rst')), str(dest.join('fakepkg.rst'))]
+    assert 'baz' in dest.join('fakepkg.rst').read()
+
+
+def test_timing(app, srcpkg, template_dirs, tmpdir):
+    timings = timing.start()
+    gendoc.generate(app, srcpkg, str(tmpdir.mkdir('out')), template_dirs=template_dirs)
+    assert timing.stop() is timings
+    assert timings.phases['import'][0] == 2
+    assert timings.phases['write'][0] == 2
+    assert set(timings.modules) == set(['fakepkg', 'fakepkg.mod'])
+    assert [m['module'] for m in timings.as_dict(1)['slowest']] == [timings.slowest(1)[0][0]]
+    assert 'slowest modules' in timings.summary(5)
+
+
+def test_profile_imports(app, srcpkg, template_dirs, tmpdir):
+    timings = timing.start(True, 1)
+    gendoc.generate(app, srcpkg, str(tmpdir.mkdir('out')), template_dirs=template_dirs)
+    timing.stop()
+    assert set(timings.imports) == set(['fakepkg', 'fakepkg.mod'])
+    assert 'fakepkg' in timings.imports['fakepkg']['loaded']
+    assert [m['module'] for m in timings.as_dict(1)['imports']] == [m for m, e in timings.slowest_imports()]
+    assert 'slowest imports' in timings.summary(5)
+    files = timings.save_profiles(str(tmpdir.join('profiles')))
+    assert len(files) == 1
+    assert pstats.Stats(files[0]).total_calls > 0
+
+
+def test_profile_isolated_imports(srcpkg, template_dirs, tmpdir):
+    config = updatedoc.make_config(isolate=True, profile_dir=str(tmpdir.join('profiles')), timing_top=5)
+    app = updatedoc.App(config, str(tmpdir), str(tmpdir.mkdir('doctrees')))
+    gendoc.update(app, srcpkg, str(tmpdir.join('out')), template_dirs)
+    assert 'fakepkg' not in sys.modules
+    assert sorted(os.listdir(str(tmpdir.join('profiles')))) == ['fakepkg.mod.prof', 'fakepkg.prof']
+
+
+def test_template_cache(app, srcpkg, template_dirs, tmpdir):
+    var = gendoc.get_context(app, 'fakepkg', 'mod', 'fakepkg.mod')
+    expected = gendoc.render_context(gendoc.create_environment(template_dirs), dict(var), False)
+    cache_dir = str(tmpdir.join('templates'))
+    for precompile in (False, True, True):
+        env = gendoc.create_environment(template_dirs, cache_dir, precompile)
+        assert gendoc.render_context(env, dict(var), False) == expected
+    assert os.listdir(os.path.join(cache_dir, 'bytecode'))
+    assert len([d for d in os.listdir(cache_dir) if d.startswith('compiled-')]) == 1
+
+
+@pytest.mark.parametrize('kill', [True, False])
+def test_isolated_importer(app, srcpkg, monkeypatch, kill):
+    if not kill:
+        # like python 3.6
+        monkeypatch.delattr(multiprocessing.process.BaseProcess, 'kill')
+    with open(os.path.join(srcpkg, 'slow.py'), 'w') as f:
+        f.write('import time\ntime.sleep(60)\n')
+    modpath = os.path.join(srcpkg, 'mod.py')
+    importer = isolate.IsolatedImporter(app, timeout=2)
+    try:
+        var, cacheable = importer.get_context('fakepkg', 'mod', 'fakepkg.mod', modpath)
+        assert var['classes'] == ['Foo']
+        assert cacheable
+        assert 'fakepkg.mod' not in sys.modules
+
+        var, cacheable = importer.get_context('fakepkg', 'slow', 'fakepkg.slow', os.path.join(srcpkg, 'slow.py'))
+        assert var['classes'] == []
+        assert not cacheable
+        assert importer.timeouts == ['fakepkg.slow']
+
+        var, cacheable = importer.get_context('fakepkg', 'mod', 'fakepkg.mod', modpath)
+        assert var['functions'] == ['bar']
+    finally:
+        importer.close()
+    assert importer.process is None
+
+
+def test_generate_evict(app, srcpkg, template_dirs, tmpdir):
+    sub = os.path.join(srcpkg, 'sub')
+    os.mkdir(sub)
+    with open(os.path.join(sub, '__init__.py'), 'w') as f:
+        f.write('from fakepkg import mod\n')
+    with open(os.path.join(sub, 'other.py'), 'w') as f:
+        f.write('def baz():\n    pass\n')
+    dest = str(tmpdir.mkdir('out'))
+    report = gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs, evict=True)
+    assert report.count(gendoc.CREATED) == 4
+    assert 'Foo' in tmpdir.join('out', 'fakepkg.mod.rst').read()
+    assert 'baz' in tmpdir.join('out', 'fakepkg.sub.other.rst').read()
+    assert [name for name in sys.modules if name.startswith('fakepkg.')] == []
+
+
+def test_iter_tree_excludes(app, srcpkg):
+    for name in ('tests', 'vendor'):
+        os.mkdir(os.path.join(srcpkg, name))
+        with open(os.path.join(srcpkg, name, '__init__.py'), 'w') as f:
+            f.write('')
+        with open(os.path.join(srcpkg, name, 'mod.py'), 'w') as f:
+            f.write('')
+    with open(os.path.join(srcpkg, 'api_pb2.py'), 'w') as f:
+        f.write('')
+
+    def names(excludes):
+        return [(name, os.path.basename(path)) for _, name, path, _ in gendoc.iter_tree(app, srcpkg, excludes, True, True)]
+
+    assert names([]) == [('', 'fakepkg'), ('tests', 'tests'), ('vendor', 'vendor')]
+    excludes = gendoc.ExcludeMatcher(['**/tests/**', '*_pb2.py', os.path.join(srcpkg, 'vendor')], srcpkg)
+    assert names(excludes) == [('', 'fakepkg')]
+    assert excludes.match(os.path.join(srcpkg, 'sub', 'api_pb2.py'))
+    assert not excludes.match(os.path.join(srcpkg, 'mod.py'))
+
+
+def test_package_index(app, srcpkg, template_dirs, tmpdir):
+    for name in ('api_pb2.py', '_hidden.py', 'ext.so'):
+        with open(os.path.join(srcpkg, name), 'w') as f:
+            f.write('')
+    os.mkdir(os.path.join(srcpkg, 'data'))
+    app.config.jinjaapi_exclude_paths = ['*_pb2.py']
+    index = gendoc.PackageIndex()
+    excludes = gendoc.ExcludeMatcher(app.config.jinjaapi_exclude_paths, srcpkg)
+    list(gendoc.iter_tree(app, srcpkg, excludes, True, False, index))
+    entry = index.get(srcpkg)
+    assert entry.subpkgs == []
+    assert entry.submods == ['ext', 'mod']
+    assert entry.modpaths == {'ext': None, 'mod': os.path.join(srcpkg, 'mod.py')}
+
+    var = gendoc.get_context(app, '', 'fakepkg', 'fakepkg', srcpkg, entry)
+    assert var['submods'] == ['ext', 'mod']
+    dest = str(tmpdir.mkdir('out'))
+    gendoc.generate(app, srcpkg, dest, exclude=app.config.jinjaapi_exclude_paths, template_dirs=template_dirs)
+    assert 'api_pb2' not in tmpdir.join('out', 'fakepkg.rst').read()
+
+
+def test_generate_writers(app, srcpkg, template_dirs, tmpdir):
+    serial = str(tmpdir.mkdir('serial'))
+    gendoc.generate(app, srcpkg, serial, template_dirs=template_dirs)
+    found = set(app.env.found_docs)
+    app.env.found_docs.clear()
+    threaded = str(tmpdir.mkdir('threaded'))
+    report = gendoc.generate(app, srcpkg, threaded, template_dirs=template_dirs, writers=2)
+    assert report.count(gendoc.CREATED) == 2
+    assert len(app.env.found_docs) == len(found) == 2
+    for name in ('fakepkg.rst', 'fakepkg.mod.rst'):
+        assert tmpdir.join('threaded', name).read() == tmpdir.join('serial', name).read()
+
+
+def test_get_outdated(app, srcpkg, template_dirs, tmpdir):
+    assert jinjaapidoc.env_get_outdated(app, app.env, set(), set(), set()) == []
+    dest = str(tmpdir.mkdir('out'))
+    gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs)
+    with open(os.path.join(srcpkg, 'mod.py'), 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n')
+    for name in [name for name in sys.modules if name.startswith('fakepkg')]:
+        del sys.modules[name]
+    app.jinjaapidoc_report = report = gendoc.generate(app, srcpkg, dest, force=True, template_dirs=template_dirs)
+    assert report.changes(app) == (set(), set(['out/fakepkg.mod']), set())
+    assert jinjaapidoc.env_get_outdated(app, app.env, set(), set(), set()) == ['out/fakepkg.mod']
+    assert jinjaapidoc.env_get_outdated(app, app.env, set(), set(['out/fakepkg.mod']), set()) == []
+
+
+def test_watch_regenerate(app, srcpkg, template_dirs, tmpdir):
+    dest = str(tmpdir.mkdir('out'))
+    gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs)
+    excludes = gendoc.ExcludeMatcher([], srcpkg)
+    modpath = os.path.join(srcpkg, 'mod.py')
+    initpath = os.path.join(srcpkg, '__init__.py')
+    assert watch.get_pages(app, srcpkg, modpath, excludes, True) == [
+        ('fakepkg', 'mod', modpath, False), ('fakepkg', '', srcpkg, True)]
+    assert watch.get_pages(app, srcpkg, initpath, excludes, True) == [('fakepkg', '', srcpkg, True)]
+    assert watch.get_pages(app, srcpkg, os.path.join(srcpkg, 'data.txt'), excludes, True) == []
+    watcher = watch.PollingWatcher(srcpkg, excludes, True, False)
+    with open(modpath, 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n')
+    os.utime(modpath, ns=(0, 0))
+    assert watcher.poll() == set([modpath])
+    assert watcher.poll() == set()
+    env = gendoc.create_environment(template_dirs)
+    report = gendoc.GenerationReport()
+    names = watch.regenerate(app, env, srcpkg, dest, [modpath], excludes, True, False, report=report)
+    assert names == ['fakepkg.mod', 'fakepkg']
+    assert report.count(gendoc.UPDATED) == 1
+    assert 'baz' in tmpdir.join('out', 'fakepkg.mod.rst').read()
+    os.remove(modpath)
+    report = gendoc.GenerationReport()
+    assert watch.regenerate(app, env, srcpkg, dest, [modpath], excludes, True, False, report=report) == ['fakepkg']
+    assert report.count(gendoc.DELETED) == 1
+    assert not tmpdir.join('out', 'fakepkg.mod.rst').check()
+    assert 'fakepkg.mod' not in tmpdir.join('out', 'fakepkg.rst').read()
+    ctx = cache.ContextCache(str(tmpdir.join('cache.json')), 'key')
+    watch.regenerate(app, env, srcpkg, dest, [initpath], excludes, True, False, cache=ctx)
+    app.config.jinjaapi_force = False
+    report = gendoc.GenerationReport()
+    watch.regenerate(app, env, srcpkg, dest, [initpath], excludes, True, False, report=report, cache=ctx)
+    assert ctx.hits == 1
+    assert report.count(gendoc.SKIPPED) == 1
+
+
+def test_generate_classes(app, srcpkg, template_dirs, tmpdir):
+    app.config.jinjaapi_generate_classes = True
+    dest = str(tmpdir.mkdir('out'))
+    report = gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs)
+    assert sorted(report.classpages) == [os.path.join(dest, 'fakepkg.mod.rst'), os.path.join(dest, 'fakepkg.rst')]
+    assert report.count(gendoc.CREATED) == 4
+    foo = tmpdir.join('out', 'fakepkg.mod', 'fakepkg.mod.Foo.rst').read()
+    assert '.. currentmodule:: fakepkg.mod' in foo
+    assert '.. autoclass:: Foo' in foo
+    err = tmpdir.join('out', 'fakepkg.mod', 'fakepkg.mod.Err.rst').read()
+    assert err.startswith('fakepkg.mod.Err\n===============\n')
+    assert '.. autoexception:: Err' in err
+    members = gendoc.get_class_members(ValueError)
+    assert 'with_traceback' in members['methods']
+    assert 'args' in members['attributes']
+    assert '__init__' in members['all_attributes']
+
+
+def test_get_pages(app):
+    var = {'fullname': 'api', 'functions': ['b', 'a2', 'c', '_a1'], 'data': ['X']}
+    assert gendoc.get_pages(app, var) == []
+    app.config.jinjaapi_page_size = 2
+    assert [(p['name'], p['title'], p['functions'], p['data']) for p in gendoc.get_pages(app, var)] == [
+        ('api-1', 'b - a2', ['b', 'a2'], []), ('api-2', 'c - _a1', ['c', '_a1'], []), ('api-3', 'X - X', [], ['X'])]
+    app.config.jinjaapi_page_grouping = 'alphabet'
+    assert [(p['name'], p['functions'], p['data']) for p in gendoc.get_pages(app, var)] == [
+        ('api-A', ['a2', '_a1'], []), ('api-B', ['b'], []), ('api-C', ['c'], []), ('api-X', [], ['X'])]
+    app.config.jinjaapi_page_grouping = 'origin'
+    origins = {'b': 'api._b', 'a2': 'api._a', 'c': 'api._b', '_a1': 'api._a'}
+    assert [(p['name'], p['functions'], p['data']) for p in gendoc.get_pages(app, var, origins)] == [
+        ('api-api', [], ['X']), ('api-api._a', ['a2', '_a1'], []), ('api-api._b', ['b', 'c'], [])]
+    assert [p['name'] for p in gendoc.get_pages(app, var)] == ['api-1', 'api-2', 'api-3']
+
+
+def test_static_context_origin_pages(app, srcpkg):
+    app.config.jinjaapi_static_analysis = True
+    app.config.jinjaapi_page_size = 1
+    app.config.jinjaapi_page_grouping = 'origin'
+    var = gendoc.get_context(app, 'fakepkg', 'mod', 'fakepkg.mod', os.path.join(srcpkg, 'mod.py'))
+    assert 'fakepkg.mod' not in sys.modules
+    assert [(p['name'], p['functions'], p['data']) for p in var['pages']] == [
+        ('fakepkg.mod-1', ['bar'], []), ('fakepkg.mod-2', [], ['VALUE'])]
+
+
+def test_generate_pages(app, srcpkg, template_dirs, tmpdir):
+    app.config.jinjaapi_page_size = 1
+    dest = str(tmpdir.mkdir('out'))
+    report = gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs)
+    assert report.count(gendoc.CREATED) == 4
+    mod = tmpdir.join('out', 'fakepkg.mod.rst').read()
+    assert 'autofunction' not in mod
+    assert 'fakepkg.mod/fakepkg.mod-1\n' in mod
+    assert 'fakepkg.mod/fakepkg.mod-2' in mod
+    page = tmpdir.join('out', 'fakepkg.mod', 'fakepkg.mod-1.rst').read()
+    assert page.startswith('fakepkg.mod: bar - bar\n======================\n')
+    assert '.. currentmodule:: fakepkg.mod' in page
+    assert '.. autofunction:: bar' in page
+    assert '.. autodata:: VALUE' in tmpdir.join('out', 'fakepkg.mod', 'fakepkg.mod-2.rst').read()
+
+
+def test_update_reuses_result(srcpkg, template_dirs, tmpdir):
+    app = updatedoc.App(updatedoc.make_config(), str(tmpdir), str(tmpdir.mkdir('doctrees')))
+    dest = str(tmpdir.join('out'))
+    report = gendoc.update(app, srcpkg, dest, template_dirs)
+    found = set(app.env.found_docs)
+    app.env.found_docs.clear()
+    reused = gendoc.update(app, srcpkg, dest, template_dirs)
+    assert app.env.found_docs == found
+    assert reused.count(gendoc.UNCHANGED) == report.count(gendoc.CREATED) == 2
+    assert reused.changes(app) == (set(), set(), set())
+    modpath = os.path.join(srcpkg, 'mod.py')
+    with open(modpath, 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n')
+    os.utime(modpath, ns=(0, 0))
+    gendoc.unload_module('fakepkg.mod')
+    assert gendoc.update(app, srcpkg, dest, template_dirs).count(gendoc.UPDATED) == 1
+    report = gendoc.update(app, srcpkg, dest, template_dirs)
+    os.remove(os.path.join(dest, 'fakepkg.rst'))
+    assert gendoc.update(app, srcpkg, dest, template_dirs).count(gendoc.CREATED) == 1
+    assert os.path.isfile(os.path.join(dest, 'fakepkg.rst'))
+
+
+def test_plan(srcpkg, template_dirs, tmpdir):
+    app = updatedoc.App(updatedoc.make_config(sync=True), str(tmpdir), str(tmpdir.mkdir('doctrees')))
+    dest = str(tmpdir.join('out'))
+    gendoc.update(app, srcpkg, dest, template_dirs)
+    app.config.jinjaapi_plan = True
+    report = gendoc.update(app, srcpkg, dest, template_dirs)
+    assert report.count(gendoc.UNCHANGED) == 2 and report.summary().startswith('0 created, 0 updated')
+    modpath = os.path.join(srcpkg, 'mod.py')
+    with open(modpath, 'a') as f:
+        f.write('\n\ndef baz():\n    pass\n')
+    os.utime(modpath, ns=(0, 0))
+    os.rename(modpath, os.path.join(srcpkg, 'newmod.py'))
+    sys.modules.pop('fakepkg.mod', None)
+    report = gendoc.update(app, srcpkg, dest, template_dirs)
+    assert 'fakepkg.newmod' not in sys.modules
+    assert report.files[gendoc.CREATED] == [os.path.join(dest, 'fakepkg.newmod.rst')]
+    assert report.files[gendoc.UPDATED] == [os.path.join(dest, 'fakepkg.rst')]
+    assert report.files[gendoc.DELETED] == [os.path.join(dest, 'fakepkg.mod.rst')]
+    assert os.path.isfile(os.path.join(dest, 'fakepkg.mod.rst'))
+    app.jinjaapidoc_report = report
+    app.env.found_docs.update(['out/fakepkg.newmod', 'out/fakepkg'])
+    assert jinjaapidoc.env_get_outdated(app, app.env, set(), set(), set()) == []
+
+
+def test_plan_reexported(reexppkg, template_dirs, tmpdir):
+    app = updatedoc.App(updatedoc.make_config(sync=True), str(tmpdir), str(tmpdir.mkdir('doctrees')))
+    dest = str(tmpdir.join('out'))
+    gendoc.update(app, reexppkg, dest, template_dirs)
+    add_reexported(reexppkg)
+    app.config.jinjaapi_plan = True
+    report = gendoc.update(app, reexppkg, dest, template_dirs)
+    assert 'fakepkg' not in sys.modules
+    assert sorted(report.files[gendoc.UPDATED]) == [os.path.join(dest, 'fakepkg.mod.rst'),
+                                                    os.path.join(dest, 'fakepkg.rst')]
+
+
+def test_main_reuses_result(srcpkg, tmpdir):
+    templates_path = []
+    dest = str(tmpdir.join('out'))
+    reports = []
+    for i in range(2):
+        app = updatedoc.App(updatedoc.make_config(srcdir=srcpkg, outputdir=dest), str(tmpdir),
+                            str(tmpdir.join('doctrees%s' % i)))
+        app.config.templates_path = templates_path
+        reports.append(gendoc.main(app))
+    assert templates_path == []
+    assert reports[1].count(gendoc.UNCHANGED) == reports[0].count(gendoc.CREATED) == 2
+
+
+def test_cli(tmpdir):
+    pkg = tmpdir.mkdir('src').mkdir('clipkg')
+    pkg.join('__init__.py').write('"""Package"""\n')
+    pkg.join('mod.py').write('def bar():\n    pass\n')
+    dest = tmpdir.mkdir('docs').join('api')
+    try:
+        assert updatedoc.main([str(pkg), str(dest), '--cache', '--delete', '-q']) == 0
+        assert '.. autofunction:: bar' in dest.join('clipkg.mod.rst').read()
+        assert tmpdir.join('docs', updatedoc.CACHE_DIR, cache.CACHE_FILENAME).check()
+        pkg.join('broken.py').write('raise ImportError("broken")\n')
+        assert updatedoc.main([str(pkg), str(dest), '--cache', '--delete', '-q']) == 1
+        assert tmpdir.join('docs', updatedoc.CACHE_DIR, cache.CACHE_FILENAME).check()
+    finally:
+        sys.path.remove(str(tmpdir.join('src')))
+        for name in [name for name in sys.modules if name.startswith('clipkg')]:
+            del sys.modules[name]
+
+
+def test_stubs(app, srcpkg, template_dirs, tmpdir):
+    with open(os.path.join(srcpkg, 'ext.pyx'), 'w') as f:
+        f.write('cimport cython\n\ncdef int _count = 0\n\n\ncpdef double dot(double[:] a, double[:] b):\n'
+                '    return 0\n\n\ncdef class Vector:\n    cdef double x\n\n\ncdef void _hidden():\n    pass\n')
+    with open(os.path.join(srcpkg, 'mod.pyi'), 'w') as f:
+        f.write('class Foo: ...\n\ndef stubbed(x: int) -> int: ...\n\nVALUE: int\n')
+    dest = str(tmpdir.mkdir('out'))
+    gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs)
+    assert 'fakepkg.ext' not in tmpdir.join('out', 'fakepkg.rst').read()
+    for name in [name for name in sys.modules if name.startswith('fakepkg')]:
+        del sys.modules[name]
+    app.config.jinjaapi_stubs = True
+    gendoc.generate(app, srcpkg, dest, force=True, template_dirs=template_dirs)
+    assert 'fakepkg.mod' not in sys.modules
+    assert 'fakepkg.ext' in tmpdir.join('out', 'fakepkg.rst').read()
+    ext = tmpdir.join('out', 'fakepkg.ext.rst').read()
+    assert '.. autofunction:: dot' in ext
+    assert 'Vector' in ext
+    assert '_hidden' not in ext and '_count' not in ext
+    mod = tmpdir.join('out', 'fakepkg.mod.rst').read()
+    assert '.. autofunction:: stubbed' in mod
+    assert '.. autofunction:: bar' not in mod
+    excludes = gendoc.ExcludeMatcher([], srcpkg)
+    stub = os.path.join(srcpkg, 'mod.pyi')
+    assert stub in gendoc.get_stamps(srcpkg, excludes, True, False)
+    assert watch.get_pages(app, srcpkg, stub, excludes, True)[0] == ('fakepkg', 'mod', os.path.join(srcpkg, 'mod.py'), False)
+
+
+def test_write_inventory(app, srcpkg, template_dirs, tmpdir):
+    dest = str(tmpdir.mkdir('out'))
+    report = gendoc.generate(app, srcpkg, dest, template_dirs=template_dirs, inventory=True)
+    fname = str(tmpdir.join('inventory.jsonl'))
+    gendoc.write_inventory(fname, srcpkg, report)
+    with apiinventory.Inventory(fname) as inv:
+        assert inv.names() == sorted(report.records)
+        assert 'fakepkg.mod' in inv
+        assert inv.get('fakepkg.nomodule') is None
+    record = apiinventory.load(fname, 'fakepkg.mod')
+    assert record['name'] == 'fakepkg.mod'
+    assert not record['ispkg']
+    assert record['path'] == 'mod.py'
+    assert record['classes'] == report.records['fakepkg.mod']['classes']
+    assert apiinventory.load(fname, 'fakepkg')['ispkg']
@@ -4,6 +4,7 @@ Tests for `jinjaapidoc` module.
 import os
 import shutil
 import subprocess
+import sys
 
 import pytest
 
@@ -31,3 +32,44 @@ def test_build(fix_doc):
     src = os.path.join(docdir, 'source')
 
     subprocess.check_call(['sphinx-build', src, out, '-W', '-v', '-N'])
+
+
+def test_lazy_import():
+    """Loading the extension must not import the generation machinery"""
+    code = ('import sys, jinjaapidoc; '
+            'print(" ".join(m for m in ("jinja2", "pkg_resources", "sphinx.ext.autosummary", "jinjaapidoc.gendoc") '
+            'if m in sys.modules))')
+    loaded = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert loaded.strip() == ''
+
+    # does not rely on a module level __getattr__, which needs python 3.7
+    code = 'import jinjaapidoc; print("__getattr__" in vars(jinjaapidoc), jinjaapidoc.ext.__name__)'
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert output.split() == ['False', 'jinjaapidoc.ext']
+
+    import jinjaapidoc
+    assert jinjaapidoc.gendoc.get_template_dir('templates') == os.path.join(
+        os.path.dirname(jinjaapidoc.__file__), 'templates')
+
+
+def test_lazy_setup():
+    """Setting up the extension must not import the generation machinery either"""
+    code = ('import sys, jinjaapidoc\n'
+            'class App(object):\n'
+            '    def __getattr__(self, name):\n'
+            '        return lambda *args, **kwargs: None\n'
+            'jinjaapidoc.setup(App())\n'
+            'print(" ".join(m for m in ("jinja2", "sphinx.ext.autosummary", "jinjaapidoc.gendoc") '
+            'if m in sys.modules))')
+    loaded = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert loaded.strip() == ''
+
+
+def test_config_rebuild():
+    """Values that change the generated documents reread the environment, performance options do not"""
+    import jinjaapidoc
+    rebuild = dict((name, value) for name, default, value in jinjaapidoc.CONFIG_VALUES)
+    for name in ('srcdir', 'exclude_paths', 'includeprivate', 'include_from_all', 'static_analysis', 'page_size'):
+        assert rebuild['jinjaapi_' + name] == 'env'
+    for name in ('cache', 'workers', 'timing', 'writer_threads', 'plan', 'profile_imports'):
+        assert rebuild['jinjaapi_' + name] == ''
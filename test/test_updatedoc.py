@@ -0,0 +1,29 @@
+"""
+Tests for `jinjaapidoc.updatedoc` module.
+"""
+import os
+import subprocess
+import sys
+
+from jinjaapidoc import updatedoc
+
+here = os.path.abspath(os.path.dirname(__file__))
+src = os.path.abspath(os.path.join(here, '..', 'src', 'jinjaapidoc'))
+
+
+def test_main(tmpdir):
+    dest = str(tmpdir.join('out'))
+    assert updatedoc.main([src, dest, '-q']) == 0
+    files = sorted(os.listdir(dest))
+    assert 'jinjaapidoc.rst' in files
+    assert 'jinjaapidoc.gendoc.rst' in files
+
+
+def test_main_invalid_src(tmpdir):
+    assert updatedoc.main([str(tmpdir.join('missing')), str(tmpdir), '-q']) == 1
+
+
+def test_console_script(tmpdir):
+    dest = str(tmpdir.join('out'))
+    subprocess.check_call([sys.executable, '-m', 'jinjaapidoc.updatedoc', src, dest, '-q'])
+    assert os.path.isfile(os.path.join(dest, 'jinjaapidoc.rst'))